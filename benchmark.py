@@ -0,0 +1,271 @@
+"""
+Seeded micro-benchmarks for the simulation and rendering hot paths.
+
+    python benchmark.py                      # run and write bench_results.json
+    python benchmark.py --save-baseline      # also store the results as the baseline
+    python benchmark.py --baseline bench_baseline.json --threshold 1.25
+
+When a baseline is given, every benchmark whose median got slower than
+threshold x baseline is reported and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import timing
+import savegame
+from headless import HeadlessRunner
+from world import WorldMap, Location, Map, Village, ForestBlock, Wall
+from path_find import PathFinder
+from entities import Goblin, Ghost
+from combat import Fight, Hit
+from settings import FIGHT_REGROUP_MS
+
+DEFAULT_OUTPUT = "bench_results.json"
+DEFAULT_BASELINE = "bench_baseline.json"
+
+BENCHMARKS = {}
+
+def benchmark(name, repeat=20):
+    """Registers setup(runner) -> callable; only the returned callable is timed."""
+    def register(setup):
+        BENCHMARKS[name] = (setup, repeat)
+        return setup
+    return register
+
+def make_maze(width, height):
+    """Map whose open cells form a perfect maze (one corridor between any two cells)."""
+    maze = Map(width, height)
+    for cord in range(width * height):
+        maze.add_object(Wall(), x=cord % width, y=cord // width)
+    stack = [(1, 1)]
+    maze.remove_object_at(1, 1, Wall)
+    while stack:
+        x, y = stack[-1]
+        options = [(x + dx, y + dy, dx, dy) for dx, dy in ((2, 0), (-2, 0), (0, 2), (0, -2))
+                   if 0 < x + dx < width - 1 and 0 < y + dy < height - 1 and maze.get_object_at(x + dx, y + dy, Wall)]
+        if not options:
+            stack.pop()
+            continue
+        nx, ny, dx, dy = random.choice(options)
+        maze.remove_object_at(x + dx // 2, y + dy // 2, Wall)
+        maze.remove_object_at(nx, ny, Wall)
+        stack.append((nx, ny))
+    return maze
+
+def crowd(runner, count):
+    """Location holding the player and `count` extra monsters."""
+    game = runner.game
+    location = game.current_map
+    free = [c for c in range(location.width * location.height) if location.passability[c]]
+    for cord in random.sample(free, min(count, len(free))):
+        x, y = cord % location.width, cord // location.width
+        location.add_entity(random.choice([Goblin, Ghost])(x, y, location), x, y)
+    return location
+
+@benchmark("world_map_generate", repeat=10)
+def bench_world_generate(runner):
+    def run():
+        WorldMap(52, 33).generate()
+    return run
+
+@benchmark("location_generate_village")
+def bench_location_village(runner):
+    return lambda: Location([Village(0, 4)])
+
+@benchmark("location_generate_forest")
+def bench_location_forest(runner):
+    return lambda: Location([ForestBlock(0)])
+
+@benchmark("path_bfs_open_map", repeat=50)
+def bench_path_open(runner):
+    open_map = Map(50, 30)
+    return lambda: PathFinder.get_path_bfs(open_map, 0, 0, 49, 29, 100)
+
+@benchmark("path_bfs_maze", repeat=50)
+def bench_path_maze(runner):
+    maze = make_maze(51, 31)
+    return lambda: PathFinder.get_path_bfs(maze, 1, 1, 49, 29, 2000)
+
+@benchmark("behave_ai_process_200_npcs")
+def bench_behave_ai(runner):
+    location = crowd(runner, 200)
+    player = runner.game.player
+    npcs = [e for e in location.entities if hasattr(e, 'behave_ai')]
+    def run():
+        runner.clock.advance(1100)  # past movement_cooldown, so every NPC acts
+        now = timing.get_ticks()
+        for npc in npcs:
+            if npc.alive:
+                npc.behave_ai.process(now, player)
+    return run
+
+@benchmark("update_entities_200_npcs_frame", repeat=200)
+def bench_update_entities(runner):
+    location = crowd(runner, 200)
+    player = runner.game.player
+    def run():
+        runner.clock.advance(16)  # one frame: only the NPCs whose wake-up came due are touched
+        location.update_entities(timing.get_ticks(), player)
+    return run
+
+@benchmark("fight_npc_ai_logic_100_npcs", repeat=50)
+def bench_fight_ai(runner):
+    location = crowd(runner, 100)
+    fight = Fight(location, runner.game.ui, runner.game.player)
+    for npc in location.entities:
+        if hasattr(npc, 'behave_ai'):
+            fight.add_party(npc)
+            npc.target = runner.game.player
+    def run():
+        runner.clock.advance(100)
+        fight.next_allowed_enemy_attack = 0
+        fight.npc_ai_logic(timing.get_ticks())
+    return run
+
+@benchmark("fight_manager_tick_300_combatants", repeat=50)
+def bench_fight_manager(runner):
+    location = crowd(runner, 300)
+    npcs = [npc for npc in location.entities if hasattr(npc, 'behave_ai')]
+    for attacker, defender in zip(npcs[::2], npcs[1::2]):
+        attacker.start_fight(defender)
+    def run():
+        # One regroup (merge, split, brawl search) plus a frame of every fight's AI
+        runner.clock.advance(FIGHT_REGROUP_MS)
+        location.fights.tick(timing.get_ticks())
+    return run
+
+@benchmark("hit_resolve_damage", repeat=50)
+def bench_hit(runner):
+    location = crowd(runner, 2)
+    player = runner.game.player
+    enemy = next(e for e in location.entities if hasattr(e, 'behave_ai'))
+    fight = Fight(location, runner.game.ui, player, enemy)
+    def run():
+        for direction in range(1000):
+            fight.directions[player] = direction % 5
+            fight.directions[enemy] = (direction // 5) % 5
+            enemy.health = 1000
+            Hit(fight, player, enemy, 0, 0, runner.game.ui).resolve_damage()
+    return run
+
+@benchmark("draw_world_only_full", repeat=50)
+def bench_draw_full(runner):
+    game = runner.game
+    def run():
+        game.world_renderer.invalidate()
+        game.dirty_rects = []
+        game.draw_world_only()
+    return run
+
+@benchmark("draw_world_only_incremental", repeat=50)
+def bench_draw_incremental(runner):
+    location = crowd(runner, 30)
+    game = runner.game
+    player = game.player
+    npcs = [e for e in location.entities if hasattr(e, 'behave_ai')]
+    def run():
+        runner.clock.advance(1100)
+        now = timing.get_ticks()
+        for npc in npcs:
+            if npc.alive:
+                npc.behave_ai.process(now, player)
+        game.dirty_rects = []
+        game.draw_world_only()
+    return run
+
+@benchmark("load_game_50_locations", repeat=10)
+def bench_load_game(runner):
+    game = runner.game
+    game.interact_environment()  # back to the world map
+    for index in range(50):
+        x, y = index % game.world_map.width, index // game.world_map.width
+        game.world_map.move_entity(game.player, x, y)
+        game.interact_environment()
+        game.interact_environment()
+    path = os.path.join(tempfile.mkdtemp(prefix="rpg-bench-"), "bench.sav")
+    savegame.save_game(game, path)
+    return lambda: savegame.load_game(game, path)
+
+def run_benchmarks(seed=1, only=None, repeat_scale=1.0):
+    results = {}
+    for name, (setup, repeat) in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        runner = HeadlessRunner(seed)
+        random.seed(seed)
+        fn = setup(runner)
+        timings = []
+        for _ in range(max(1, int(repeat * repeat_scale))):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        ordered = sorted(timings)
+        results[name] = {
+            "median_ms": statistics.median(timings),
+            "mean_ms": statistics.fmean(timings),
+            "p99_ms": ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)],
+            "min_ms": ordered[0],
+            "max_ms": ordered[-1],
+            "runs": len(timings),
+        }
+        result = results[name]
+        # Mean, p99 and max show work that arrives in bursts, which the median alone hides
+        print(f"{name:32s} median {result['median_ms']:9.3f} ms   mean {result['mean_ms']:9.3f} ms   "
+              f"p99 {result['p99_ms']:9.3f} ms   max {result['max_ms']:9.3f} ms   min {result['min_ms']:9.3f} ms")
+    return results
+
+def compare(results, baseline, threshold):
+    """Returns the names of benchmarks whose median exceeds threshold x the baseline median."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base["median_ms"]:
+            continue
+        ratio = result["median_ms"] / base["median_ms"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"{name:32s} {ratio:6.2f}x baseline {flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the seeded benchmark suite.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="*", help="benchmark names to run")
+    parser.add_argument("--repeat-scale", type=float, default=1.0, help="multiply every benchmark's repeat count")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": run_benchmarks(args.seed, args.only, args.repeat_scale),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report["results"], baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,215 @@
+import random
+import zlib
+from collections import OrderedDict
+from settings import WORLD_CHUNK_SIZE, WORLD_CHUNK_BUDGET, FOREST_DENSITY, VILLAGE_DENSITY
+from world import WorldMap, Village, ForestBlock, ForestGenerator, TERRAIN, PLAIN_ID
+
+FOREST_DECAY = 10
+
+class Chunk:
+    """Square block of terrain ids plus the passability bitmaps derived from them."""
+    def __init__(self, terrain: bytearray):
+        self.terrain = terrain
+        self.terrain_passability = terrain.translate(TERRAIN.passable_table())
+        self.passability = bytearray(self.terrain_passability)
+        self.dirty = False  # terrain changed since it was generated or restored
+
+class ChunkLayer:
+    """
+    Flat, cord-indexed view of one per-chunk bytearray, so code written
+    against Map.terrain / Map.passability keeps working on a chunked map.
+    """
+    def __init__(self, map_obj, name: str):
+        self.map = map_obj
+        self.name = name
+
+    def __len__(self):
+        return self.map.width * self.map.height
+
+    def __getitem__(self, cord: int) -> int:
+        chunk, local = self.map._locate(cord)
+        return getattr(chunk, self.name)[local]
+
+    def __setitem__(self, cord: int, value: int):
+        chunk, local = self.map._locate(cord)
+        getattr(chunk, self.name)[local] = value
+
+class ChunkedWorldMap(WorldMap):
+    """
+    World map split into chunk_size x chunk_size chunks that are generated on
+    first access from (seed, chunk position) and kept in an LRU under a byte
+    budget. Evicted chunks are regenerated on the next access; chunks whose
+    terrain was changed are kept zlib-compressed instead. Villages and other
+    objects live in the shared objects dict and are placed once per chunk.
+    """
+    def __init__(self, width: int, height: int, seed: int = None, chunk_size: int = WORLD_CHUNK_SIZE,
+                 budget: int = WORLD_CHUNK_BUDGET):
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.chunk_size = chunk_size
+        self.budget = budget
+        self.forest_density = FOREST_DENSITY
+        self.village_density = VILLAGE_DENSITY
+        super().__init__(width, height)
+
+    def _init_grid(self):
+        self.chunks = OrderedDict()  # (chunk_x, chunk_y) -> Chunk, least recently used first
+        self.stash = {}              # (chunk_x, chunk_y) -> compressed terrain of evicted, changed chunks
+        self.populated = set()       # chunks whose villages were already placed
+        self.generated = 0
+        self.restored = 0
+        self.evicted = 0
+        self.terrain = ChunkLayer(self, 'terrain')
+        self.terrain_passability = ChunkLayer(self, 'terrain_passability')
+        self.passability = ChunkLayer(self, 'passability')
+        self.objects = {}
+        self._blockers = {}
+        self._reset_logs()
+
+    def generate(self, forest_density: float = FOREST_DENSITY, village_density: float = VILLAGE_DENSITY):
+        """Only stores the densities; chunks are generated as they are first touched."""
+        self.forest_density = forest_density
+        self.village_density = village_density
+
+    def _set_terrain_id(self, cord: int, palette_id: int):
+        chunk, local = self._locate(cord)
+        chunk.terrain[local] = palette_id
+        chunk.dirty = True
+        self.terrain_log.record(cord)
+
+    def is_passable(self, x: int, y: int) -> bool:
+        if not (0 <= x < self.width and 0 <= y < self.height): return False
+        chunk, local = self._locate(x + y * self.width)
+        return chunk.passability[local] == 1
+
+    def is_terrain_passable(self, x: int, y: int) -> bool:
+        if not (0 <= x < self.width and 0 <= y < self.height): return False
+        chunk, local = self._locate(x + y * self.width)
+        return chunk.terrain_passability[local] == 1
+
+    def flow_field_to(self, target):
+        """None: a field would cover every chunk, so chasers here plan their own path."""
+        return None
+
+    def region_labels(self):
+        """None: labelling would touch every chunk, so searches and region_at here skip the region check."""
+        return None
+
+    def has_line_of_sight(self, x: int, y: int, target_x: int, target_y: int, radius: int) -> bool:
+        """Distance only; ChunkedWorldMap holds no NPCs that would need the shadowcast."""
+        return abs(target_x - x) <= radius and abs(target_y - y) <= radius
+
+    def _locate(self, cord: int):
+        """(chunk, index inside the chunk) for a map cord, loading the chunk if needed."""
+        size = self.chunk_size
+        x, y = cord % self.width, cord // self.width
+        key = (x // size, y // size)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self._load(key)
+        else:
+            self.chunks.move_to_end(key)
+        return chunk, x % size + (y % size) * size
+
+    def stream_around(self, x: int, y: int, radius: int):
+        """Makes sure every chunk within radius tiles of (x, y) is resident."""
+        size = self.chunk_size
+        for chunk_y in range(max(0, y - radius) // size, min(self.height - 1, y + radius) // size + 1):
+            for chunk_x in range(max(0, x - radius) // size, min(self.width - 1, x + radius) // size + 1):
+                if (chunk_x, chunk_y) in self.chunks:
+                    self.chunks.move_to_end((chunk_x, chunk_y))
+                else:
+                    self._load((chunk_x, chunk_y))
+
+    def memory_bytes(self) -> int:
+        return len(self.chunks) * 3 * self.chunk_size ** 2 + sum(len(data) for data in self.stash.values())
+
+    def stats(self) -> dict:
+        return {
+            "resident": len(self.chunks),
+            "stashed": len(self.stash),
+            "generated": self.generated,
+            "restored": self.restored,
+            "evicted": self.evicted,
+            "memory_bytes": self.memory_bytes(),
+            "budget": self.budget,
+        }
+
+    def _load(self, key):
+        data = self.stash.pop(key, None)
+        if data is not None:
+            chunk = Chunk(bytearray(zlib.decompress(data)))
+            chunk.dirty = True
+            self.restored += 1
+        else:
+            chunk = Chunk(self._generate_terrain(*key))
+            self.generated += 1
+        self._apply_blockers(key, chunk)
+        self.chunks[key] = chunk
+
+        if key not in self.populated:
+            self.populated.add(key)
+            self._place_villages(*key)
+        self._evict()
+        return chunk
+
+    def _evict(self):
+        chunk_bytes = 3 * self.chunk_size ** 2
+        while len(self.chunks) > 1 and len(self.chunks) * chunk_bytes > self.budget:
+            key, chunk = self.chunks.popitem(last=False)
+            if chunk.dirty:
+                self.stash[key] = zlib.compress(bytes(chunk.terrain))
+            self.evicted += 1
+
+    def _apply_blockers(self, key, chunk):
+        size = self.chunk_size
+        for cord in self._blockers:
+            x, y = cord % self.width, cord // self.width
+            if (x // size, y // size) == key:
+                chunk.passability[x % size + (y % size) * size] = 0
+
+    def _chunk_rng(self, kind: str, chunk_x: int, chunk_y: int, index: int = 0):
+        return random.Random(f"{self.seed}:{kind}:{chunk_x}:{chunk_y}:{index}")
+
+    def _chunk_count(self, rng, density: float) -> int:
+        """Number of features in one chunk: density x area, with the fraction rounded at random."""
+        expected = density * self.chunk_size ** 2
+        return int(expected) + (rng.random() < expected - int(expected))
+
+    def _forest_starts(self, chunk_x: int, chunk_y: int):
+        rng = self._chunk_rng("forest", chunk_x, chunk_y)
+        size = self.chunk_size
+        for index in range(self._chunk_count(rng, self.forest_density)):
+            yield index, chunk_x * size + rng.randrange(size), chunk_y * size + rng.randrange(size)
+
+    def _generate_terrain(self, chunk_x: int, chunk_y: int) -> bytearray:
+        """
+        Grows every forest started in this chunk or close enough to reach into
+        it from a neighbour, so forests continue across chunk borders.
+        """
+        size = self.chunk_size
+        reach = ForestGenerator.reach(FOREST_DECAY)
+        x0, y0 = chunk_x * size, chunk_y * size
+        x1, y1 = min(x0 + size, self.width), min(y0 + size, self.height)
+        forested = TERRAIN.with_block(PLAIN_ID, TERRAIN.blocks.setdefault(ForestBlock, ForestBlock(0)))
+        terrain = bytearray([PLAIN_ID]) * (size * size)
+
+        for near_y in range(chunk_y - 1, chunk_y + 2):
+            for near_x in range(chunk_x - 1, chunk_x + 2):
+                if near_x < 0 or near_y < 0: continue
+                for index, x, y in self._forest_starts(near_x, near_y):
+                    if x >= self.width or y >= self.height: continue
+                    if not (x0 - reach <= x < x1 + reach and y0 - reach <= y < y1 + reach): continue
+                    rng = self._chunk_rng("forest", near_x, near_y, index + 1)
+                    for cell_x, cell_y in ForestGenerator.spread(x, y, FOREST_DECAY, rng):
+                        if x0 <= cell_x < x1 and y0 <= cell_y < y1:
+                            terrain[cell_x - x0 + (cell_y - y0) * size] = forested
+        return terrain
+
+    def _place_villages(self, chunk_x: int, chunk_y: int):
+        rng = self._chunk_rng("village", chunk_x, chunk_y)
+        size = self.chunk_size
+        for _ in range(self._chunk_count(rng, self.village_density)):
+            x, y = chunk_x * size + rng.randrange(size), chunk_y * size + rng.randrange(size)
+            houses = rng.randint(2, 4)
+            if self.check_cords(x, y):
+                self.add_object(Village(x + y * self.width, houses), x=None, y=None)
@@ -1,10 +1,16 @@
 import random
 import pygame
-from settings import COLORS, HIT_CHANCE, DIRECTION_CHANGE_CHANCE, HIT_DELAY_MS, GLOBAL_COOLDOWN_MS
-from items import Sword, Helmet, BreastPlate, Leggings
+from profiler import profiled
+from settings import (COLORS, HIT_CHANCE, DIRECTION_CHANGE_CHANCE, HIT_DELAY_MS, GLOBAL_COOLDOWN_MS,
+                      FIGHT_RANGE, FIGHT_REGROUP_MS)
+
+class NoMessages:
+    """Stands in for the UI panel where nobody watches: fights without the player, offscreen simulation."""
+    def add_message(self, text, color=None):
+        pass
 
 class Fight:
-    """Manages combat logic between player and entities."""
+    """Manages combat logic between the entities of one party, the player or NPCs."""
     def __init__(self, map_obj, ui_panel, *party):
         self.map = map_obj
         self.ui_panel = ui_panel 
@@ -12,6 +18,15 @@ class Fight:
         self.directions = {} # Entity -> Int (0-4)
         self.set_directions()
         self.next_allowed_enemy_attack = 0
+        self.merged_into = None  # fight that took over this one's party (FightManager)
+
+    @property
+    def current(self):
+        """This fight, or the one it was merged into; pending hits resolve there."""
+        fight = self
+        while fight.merged_into is not None:
+            fight = fight.merged_into
+        return fight
 
     def add_party(self, entity):
         if entity not in self.party:
@@ -32,20 +47,6 @@ class Fight:
 
         self.check_active()
 
-    def update_distances(self, player):
-        """Removes entities that wander too far during combat."""
-        for entity in self.party[:]: 
-            if entity == player: continue
-            
-            if entity.map != player.map:
-                self.remove_entity(entity)
-                continue
-
-            dist_x = abs(entity.x - player.x)
-            dist_y = abs(entity.y - player.y)
-            if dist_x > 10 or dist_y > 10:
-                self.remove_entity(entity)
-
     def set_directions(self):
         for entity in self.party:
             if hasattr(entity, 'is_player') and entity.is_player:
@@ -70,12 +71,13 @@ class Fight:
 
         if player.can_hit:
             player.last_hit_time = current_time
-            self.map.events.append(
-                Hit(self, player, player.target, HIT_DELAY_MS, current_time, self.ui_panel)
-            )
+            hit = Hit(self, player, player.target, HIT_DELAY_MS, current_time, self.ui_panel)
+            self.map.events.schedule(hit, hit.due_time, owner=player)
             self.ui_panel.add_message("You swing...", COLORS["WHITE"])
 
+    @profiled("Fight.npc_ai_logic")
     def npc_ai_logic(self, current_time: int):
+        player_struck = False
         for entity in self.party:
             if hasattr(entity, 'is_player') and entity.is_player:
                 continue
@@ -86,21 +88,24 @@ class Fight:
                     entity.last_direction_change = current_time
                     self.directions[entity] = random.randint(0, 4)
             
-            # Attack Logic
-            if current_time > self.next_allowed_enemy_attack:
-                if entity.can_hit:
-                    if random.randint(0, 50) < HIT_CHANCE: 
-                        target = entity.target
-                        if target:
-                            dist_x = abs(entity.x - target.x)
-                            dist_y = abs(entity.y - target.y)
-                            if dist_x <= 1 and dist_y <= 1:
-                                entity.last_hit_time = current_time
-                                self.map.events.append(
-                                    Hit(self, entity, target, HIT_DELAY_MS, current_time, self.ui_panel)
-                                )
+            # Attack Logic: blows at the player share the fight's global cooldown,
+            # NPCs fighting each other only wait for their own hit cooldown
+            target = entity.target
+            at_player = getattr(target, 'is_player', False)
+            if at_player and (player_struck or current_time <= self.next_allowed_enemy_attack):
+                continue
+            if entity.can_hit:
+                if random.randint(0, 50) < HIT_CHANCE: 
+                    if target:
+                        dist_x = abs(entity.x - target.x)
+                        dist_y = abs(entity.y - target.y)
+                        if dist_x <= 1 and dist_y <= 1:
+                            entity.last_hit_time = current_time
+                            hit = Hit(self, entity, target, HIT_DELAY_MS, current_time, self.ui_panel)
+                            self.map.events.schedule(hit, hit.due_time, owner=entity)
+                            if at_player:
                                 self.next_allowed_enemy_attack = current_time + GLOBAL_COOLDOWN_MS
-                                break 
+                                player_struck = True
 
     def check_active(self):
         if len(self.party) <= 1:
@@ -130,8 +135,169 @@ class Fight:
                     colors[p_dir] = COLORS["BLUE"] # Clear
         return colors
 
+class FightManager:
+    """
+    Every fight running on one map. tick() runs the enemy AI of all of them
+    each frame, and every FIGHT_REGROUP_MS regroups them from the map's
+    entity positions: fighters within FIGHT_RANGE of each other, directly or
+    through others, form one cluster. Clusters spanning several fights merge
+    them, fights spread over several clusters split, and fighters with no
+    foe left in their cluster drop out. Aggressive NPCs next to a passive
+    one also start fights with it then, as in the offscreen simulation.
+    """
+    def __init__(self, map_obj):
+        self.map = map_obj
+        self.fights = []
+        self.next_regroup = 0
+
+    def __len__(self):
+        return len(self.fights)
+
+    def add(self, fight):
+        """Takes over a fight built elsewhere (a loaded save)."""
+        for member in fight.party:
+            member.fight = fight
+        self.fights.append(fight)
+
+    def engage(self, attacker, defender, ui_panel=None):
+        """Puts attacker and defender in one fight, starting or merging fights as needed, and returns it."""
+        fight, other = attacker.fight, defender.fight
+        if fight is None and other is None:
+            fight = Fight(self.map, ui_panel or NoMessages(), attacker, defender)
+            self.add(fight)
+        elif fight is None:
+            fight = other
+            fight.add_party(attacker)
+        elif other is None:
+            fight.add_party(defender)
+        elif fight is not other:
+            fight = self.merge(fight, other)
+        attacker.in_fight = defender.in_fight = True
+        if defender.target is None and hasattr(defender, 'attitude'):
+            defender.target = attacker  # NPCs turn on whoever attacked them
+        if ui_panel is not None:
+            fight.ui_panel = ui_panel
+        return fight
+
+    def merge(self, fight, other):
+        """Moves the smaller fight's party into the larger one and returns the larger."""
+        if len(other.party) > len(fight.party):
+            fight, other = other, fight
+        for member in list(other.party):  # _move takes each one out of other.party
+            self._move(member, other, fight)
+        if isinstance(fight.ui_panel, NoMessages):
+            fight.ui_panel = other.ui_panel
+        return fight
+
+    def _move(self, member, old, new):
+        new.party.append(member)
+        new.directions[member] = old.directions.pop(member, 0)
+        old.party.remove(member)
+        member.fight = new
+        new.next_allowed_enemy_attack = max(new.next_allowed_enemy_attack, old.next_allowed_enemy_attack)
+        if not old.party:
+            old.merged_into = new
+            self.fights.remove(old)
+
+    def tick(self, now: int):
+        if now >= self.next_regroup:
+            self.next_regroup = now + FIGHT_REGROUP_MS
+            self.start_brawls()
+            self.regroup()
+        for fight in self.fights:
+            fight.npc_ai_logic(now)
+
+    def start_brawls(self):
+        entity_index = self.map.entity_index
+        for entity in self.map.entities:
+            if getattr(entity, 'attitude', None) != 'aggressive' or entity.in_fight:
+                continue
+            for other in entity_index.within(entity.x, entity.y, 1):
+                if getattr(other, 'attitude', None) == 'passive' and other.alive:
+                    entity.start_fight(other)
+                    break
+
+    def clusters(self) -> list:
+        """Fighters on this map grouped by FIGHT_RANGE reach, largest group first."""
+        positions = self.map.entity_index.positions
+        parent = {}
+        cells = {}  # FIGHT_RANGE-sized cells: everyone in one cell is in range of each other
+        for fight in self.fights:
+            for member in fight.party:
+                if member in positions:
+                    parent[member] = member
+                    x, y = positions[member]
+                    cells.setdefault((x // FIGHT_RANGE, y // FIGHT_RANGE), []).append(member)
+
+        def find(member):
+            while parent[member] is not member:
+                parent[member] = parent[parent[member]]
+                member = parent[member]
+            return member
+
+        for members in cells.values():
+            root = find(members[0])
+            for member in members[1:]:
+                parent[find(member)] = root
+        # Fighters in range of each other are at most one cell apart
+        for (cell_x, cell_y), members in cells.items():
+            for key in ((cell_x + 1, cell_y - 1), (cell_x + 1, cell_y), (cell_x + 1, cell_y + 1), (cell_x, cell_y + 1)):
+                others = cells.get(key)
+                if not others or find(members[0]) is find(others[0]):
+                    continue
+                if any(abs(positions[a][0] - positions[b][0]) <= FIGHT_RANGE
+                       and abs(positions[a][1] - positions[b][1]) <= FIGHT_RANGE for a in members for b in others):
+                    parent[find(others[0])] = find(members[0])
+
+        groups = {}
+        for member in parent:
+            groups.setdefault(find(member), []).append(member)
+        return sorted(groups.values(), key=len, reverse=True)
+
+    def regroup(self):
+        dropped = [member for fight in self.fights for member in fight.party
+                   if member not in self.map.entity_index]
+        claimed = set()
+        for group in self.clusters():
+            members = set(group)
+            targeted = {member.target for member in group}
+            fighting = [member for member in group if member.target in members or member in targeted]
+            if len(fighting) < 2:
+                dropped.extend(group)  # nobody here is fighting anyone in reach
+                continue
+            dropped.extend(member for member in group if member not in targeted and member.target not in members)
+            group = fighting
+            counts = {}
+            for member in group:
+                counts[member.fight] = counts.get(member.fight, 0) + 1
+            home = max((fight for fight in counts if fight not in claimed), key=counts.get, default=None)
+            if home is None:
+                home = Fight(self.map, NoMessages())
+                self.fights.append(home)
+            claimed.add(home)
+            panel = next((member.fight.ui_panel for member in group if getattr(member, 'is_player', False)),
+                         NoMessages())
+            for member in group:
+                if member.fight is not home:
+                    self._move(member, member.fight, home)
+            home.ui_panel = panel
+        for member in dropped:
+            if member.fight is not None:
+                member.fight.remove_entity(member)
+        self.fights = [fight for fight in self.fights if fight.party]
+
+    def end_all(self):
+        """Stops every fight and its pending hits, e.g. once the player leaves and the map is no longer run."""
+        for fight in self.fights:
+            for member in list(fight.party):
+                self.map.events.cancel_owner(member)
+                fight.remove_entity(member)
+        self.fights.clear()
+
 class Hit:
     """Represents a pending attack event."""
+    __slots__ = ('fight', 'attacker', 'defender', 'delay', 'created_time', 'ui_panel')
+
     def __init__(self, fight, attacker, defender, delay, created_time, ui_panel):
         self.fight = fight
         self.attacker = attacker
@@ -140,47 +306,32 @@ class Hit:
         self.created_time = created_time
         self.ui_panel = ui_panel
 
-    def process(self, current_time: int) -> bool:
-        """Returns True if the hit is finished and should be removed."""
-        if self.created_time + self.delay < current_time:
-            self.resolve_damage()
-            return True
-        return False
+    @property
+    def due_time(self) -> int:
+        """First game time the hit lands (strictly after created_time + delay)."""
+        return self.created_time + self.delay + 1
 
+    def fire(self, current_time: int):
+        self.resolve_damage()
+
+    @profiled("Hit.resolve_damage")
     def resolve_damage(self):
         if not self.attacker or not self.defender: return
-        if self.attacker not in self.fight.directions or self.defender not in self.fight.directions: return
+        fight = self.fight.current
+        if self.attacker not in fight.directions or self.defender not in fight.directions: return
 
-        att_dir = self.fight.directions.get(self.attacker, 0)
-        def_dir = self.fight.directions.get(self.defender, 0)
+        att_dir = fight.directions.get(self.attacker, 0)
+        def_dir = fight.directions.get(self.defender, 0)
 
         if att_dir == def_dir:
             self.ui_panel.add_message(f"{self.defender.symbol} BLOCKED {self.attacker.symbol}!", COLORS["PURPLE"])
             return
 
-        damage = self.attacker.strength
-        weapon = self.get_equipped_item(self.attacker, Sword)
-        if weapon: damage += weapon.damage
-
-        # Armor Logic
-        armor = None
-        if att_dir == 0: armor = self.get_equipped_item(self.defender, Helmet)
-        elif att_dir in [1, 4]: armor = self.get_equipped_item(self.defender, BreastPlate)
-        elif att_dir in [2, 3]: armor = self.get_equipped_item(self.defender, Leggings)
-
-        if armor: damage -= armor.protection
-
-        damage = max(0, damage)
+        # Strength plus weapon, less the armor covering att_dir; both cached on equip
+        damage = max(0, self.attacker.attack - self.defender.protection[att_dir])
         
         if damage > 0:
             self.defender.get_damage(damage, attacker=self.attacker)
             self.ui_panel.add_message(f"{self.attacker.symbol} hit {self.defender.symbol} for {damage}", COLORS["RED"])
         else:
             self.ui_panel.add_message(f"{self.attacker.symbol} hit armor (0 dmg)", COLORS["GREY"])
-
-    def get_equipped_item(self, entity, item_type):
-        source = entity.weapon if item_type == Sword else entity.armor
-        for item in source:
-            if isinstance(item, item_type):
-                return item
-        return None
\ No newline at end of file
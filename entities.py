@@ -1,14 +1,22 @@
-import pygame
 import random
-from path_find import seek_path
-from items import Sword, Helmet, Leggings, BreastPlate, Potion, Coins
-from settings import COLORS
+import timing
+from items import Sword, Potion, WEAPON, EQUIPMENT_SLOTS, DIRECTION_SLOTS
+from inventory import Inventory
+from settings import COLORS, CHASE_PLANNER
+from path_find import IncrementalPlanner
 # --- FIX: IMPORT FROM WORLD, NOT BLOCKS ---
 from world import ItemsPile 
 # ------------------------------------------
 
+AGGRO_DISTANCE = 4  # aggressive NPCs start a fight when dist_x + dist_y is below this
+NO_PROTECTION = (0,) * len(DIRECTION_SLOTS)
+
 class LivingEntity:
     """Base class for any moving actor in the game (Player, NPCs)."""
+    __slots__ = ('x', 'y', 'symbol', 'map', 'health', 'strength', 'alive', 'color', 'items', 'equipment',
+                 'attack', 'protection', 'target', 'in_fight', 'fight', 'last_hit_time', 'hit_cooldown',
+                 'priority', 'passable')
+
     def __init__(self, x: int, y: int, symbol: str, map_obj, health: int, strength: int):
         self.x = x
         self.y = y
@@ -20,8 +28,12 @@ class LivingEntity:
         self.color = COLORS["WHITE"]
         
         self.items = []
-        self.weapon = []
-        self.armor = []
+        # Worn gear by slot (items.WEAPON, HELMET, BREASTPLATE, LEGGINGS), and what
+        # hits read from it: total attack and protection per fight direction.
+        # Recomputed by refresh_equipment() whenever gear or strength changes.
+        self.equipment = [None] * EQUIPMENT_SLOTS
+        self.attack = strength
+        self.protection = NO_PROTECTION
         
         self.target = None
         self.in_fight = False
@@ -65,33 +77,60 @@ class LivingEntity:
             if hasattr(entity, 'target') and entity.target == self:
                 entity.target = None
 
+    def equip(self, item):
+        """Puts item in its equipment slot and returns the item it replaced; equipped flags are the caller's."""
+        previous = self.equipment[item.SLOT]
+        self.equipment[item.SLOT] = item
+        self.refresh_equipment()
+        return previous
+
+    def unequip(self, item):
+        if self.equipment[item.SLOT] is item:
+            self.equipment[item.SLOT] = None
+            self.refresh_equipment()
+
+    def refresh_equipment(self):
+        weapon = self.equipment[WEAPON]
+        self.attack = self.strength + (weapon.damage if weapon is not None else 0)
+        equipment = self.equipment
+        self.protection = tuple(equipment[slot].protection if equipment[slot] is not None else 0
+                                for slot in DIRECTION_SLOTS)
+
+    @property
+    def weapon(self) -> list:
+        """The equipped weapon, as a list of zero or one item."""
+        weapon = self.equipment[WEAPON]
+        return [weapon] if weapon is not None else []
+
+    @property
+    def armor(self) -> list:
+        return [item for item in self.equipment[WEAPON + 1:] if item is not None]
+
     @property 
     def cord(self):
         return self.map.width * self.y + self.x
 
     @property
     def can_hit(self):
-        return pygame.time.get_ticks() > self.last_hit_time + self.hit_cooldown
+        return timing.get_ticks() > self.last_hit_time + self.hit_cooldown
     
     def __str__(self):
         return self.symbol
 
 class Player(LivingEntity):
+    __slots__ = ('is_player', 'vision', 'base_strength', 'hotbar')
+
     def __init__(self, x, y, map_obj):
         super().__init__(x, y, '@', map_obj, health=30, strength=5)
         self.is_player = True 
         self.vision = 20
         self.hit_cooldown = 200 
+        self.items = Inventory()
         self.base_strength = 5
         self.hotbar = [None] * 5 
 
     def add_item(self, new_item):
-        if isinstance(new_item, Coins):
-            for item in self.items:
-                if isinstance(item, Coins):
-                    item.price += new_item.price
-                    return 
-        self.items.append(new_item)
+        return self.items.add(new_item)
 
     def trigger_hotbar(self, slot_index: int):
         if 0 <= slot_index < 5:
@@ -102,50 +141,42 @@ class Player(LivingEntity):
                 self.hotbar[slot_index] = None
 
     def equip_item(self, item):
-        if isinstance(item, Sword):
-            for w in self.weapon: w.equipped = False
-            self.weapon = [item]
-            item.equipped = True
-        
-        elif isinstance(item, (Helmet, BreastPlate, Leggings)):
-            for a in self.armor[:]:
-                if type(a) == type(item):
-                    a.equipped = False
-                    self.armor.remove(a)
-            self.armor.append(item)
+        if item.SLOT is not None:
+            previous = self.equip(item)
+            if previous is not None:
+                previous.equipped = False
             item.equipped = True
         
         elif isinstance(item, Potion):
             self.health = min(30, self.health + 10) 
-            self.items.remove(item)
-            if item in self.hotbar:
+            self.items.take(item)
+            if item not in self.items and item in self.hotbar:
                 self.hotbar[self.hotbar.index(item)] = None
             
         self.recalculate_stats()
 
     def recalculate_stats(self):
-        self.strength = self.base_strength
-        for w in self.weapon:
-            if w.equipped:
-                self.strength += w.damage
+        weapon = self.equipment[WEAPON]
+        self.strength = self.base_strength + (weapon.damage if weapon is not None and weapon.equipped else 0)
+        self.refresh_equipment()
 
 class NPC(LivingEntity):
+    __slots__ = ('attitude', 'vision', 'is_player', 'movement_cooldown', 'last_moved', 'change_direction_time',
+                 'last_direction_change', 'move_ai', 'behave_ai')
+
     def __init__(self, x, y, symbol, attitude, map_obj, vision, strength, health, weapon, armor):
         super().__init__(x, y, symbol, map_obj, health, strength)
         self.attitude = attitude
         self.vision = vision
         self.is_player = False
         
-        self.weapon = weapon if weapon else []
-        self.armor = armor if armor else []
-        self.items.extend(self.weapon)
-        self.items.extend(self.armor)
+        for item in (weapon or []) + (armor or []):
+            self.equip(item)
+            self.items.append(item)
 
         self.movement_cooldown = 1000
-        self.last_moved = 0
-        self.path_cooldown = 2000
-        self.last_path_calc = 0
-        self.path = []
+        # Starts at a random point of its cooldown, so NPCs created together do not all move in the same frame
+        self.last_moved = timing.get_ticks() - random.randint(0, self.movement_cooldown)
         self.hit_cooldown = 2000 
         self.change_direction_time = 1500
         self.last_direction_change = 0
@@ -154,72 +185,110 @@ class NPC(LivingEntity):
         self.behave_ai = BehaveAI(self)
 
     def update(self, current_time, player):
-        self.behave_ai.process(current_time, player)
+        return self.behave_ai.process(current_time, player)
 
     def make_step(self, current_time):
         self.last_moved = current_time
         new_x, new_y = self.move_ai.get_next_step(current_time)
-        self.map.remove_entity(self)
-        self.x, self.y = new_x, new_y
-        self.map.add_entity(self, self.x, self.y)
+        self.map.move_entity(self, new_x, new_y)
 
     def start_fight(self, target):
-        self.in_fight = True
         self.target = target
-        target.in_fight = True
+        self.map.fights.engage(self, target)
 
     def can_change_direction(self, current_time):
         return current_time > self.change_direction_time + self.last_direction_change
 
     @property
     def can_move(self):
-        return pygame.time.get_ticks() > self.last_moved + self.movement_cooldown
+        return timing.get_ticks() > self.last_moved + self.movement_cooldown
+
+    def can_move_at(self, current_time):
+        return current_time > self.last_moved + self.movement_cooldown
 
     def sees_player(self, player):
         dist_x = abs(self.x - player.x)
         dist_y = abs(self.y - player.y)
-        return dist_x <= self.vision and dist_y <= self.vision
+        if dist_x > self.vision or dist_y > self.vision:
+            return False
+        # Cast from the player's side: every NPC watching them shares that one cached field
+        return self.map.has_line_of_sight(player.x, player.y, self.x, self.y, self.vision)
 
 class BehaveAI:
     def __init__(self, entity):
         self.entity = entity
     
     def process(self, current_time, player):
+        """Runs one decision and returns the game time this NPC next has something to do."""
         dist_x = abs(self.entity.x - player.x)
         dist_y = abs(self.entity.y - player.y)
         is_adjacent = (dist_x <= 1 and dist_y <= 1)
         
         if not is_adjacent and not self.entity.in_fight and self.entity.attitude == 'aggressive':
-             if dist_x + dist_y < 4:
+             if dist_x + dist_y < AGGRO_DISTANCE and self.entity.sees_player(player):
                  self.entity.start_fight(player)
         
-        if self.entity.can_move:
+        if self.entity.can_move_at(current_time):
+            foe = self.foe(player)
             should_move = False
             if not self.entity.in_fight:
                 should_move = True
-            elif self.entity.in_fight and not is_adjacent:
+            elif self.entity.in_fight and not self.is_adjacent(foe):
                 should_move = True
             
             if should_move:
-                self.entity.target = player
+                self.entity.target = foe
                 self.entity.make_step(current_time)
+        return self.next_wake(current_time, player)
+
+    def foe(self, player):
+        """Who the NPC is after: its target in a fight (maybe another NPC), otherwise the player."""
+        entity = self.entity
+        return entity.target if entity.in_fight and entity.target is not None else player
+
+    def is_adjacent(self, other) -> bool:
+        return abs(self.entity.x - other.x) <= 1 and abs(self.entity.y - other.y) <= 1
+
+    def next_wake(self, current_time, player):
+        """
+        The next move is due once the movement cooldown has passed. An NPC that
+        just stepped into aggro range checks again next frame; the player
+        walking into range wakes NPCs through Map.wake_near.
+        """
+        entity = self.entity
+        dist_x = abs(entity.x - player.x)
+        dist_y = abs(entity.y - player.y)
+        is_adjacent = (dist_x <= 1 and dist_y <= 1)
+        if entity.attitude == 'aggressive' and not entity.in_fight and not is_adjacent \
+                and dist_x + dist_y < AGGRO_DISTANCE and entity.sees_player(player):
+            return current_time + 1
+        if entity.in_fight and self.is_adjacent(self.foe(player)):
+            # Holds its ground until the foe steps away (wake_near) or the fight ends
+            return current_time + entity.movement_cooldown
+        return max(current_time + 1, entity.last_moved + entity.movement_cooldown + 1)
 
 class MoveAI:
     def __init__(self, entity):
         self.entity = entity
+        self.planner = None
         
     def get_next_step(self, current_time):
         target = self.entity.target
         if self.entity.attitude == 'aggressive' and target:
             if self.entity.sees_player(target):
-                if current_time > self.entity.last_path_calc + self.entity.path_cooldown:
-                    self.entity.last_path_calc = current_time
-                    self.entity.path = seek_path(self.entity, target.x, target.y)
-
-                if self.entity.path:
-                    next_node = self.entity.path.pop(0)
-                    if self.entity.map.is_passable(next_node[0], next_node[1]):
-                        return next_node
+                # The shared flow field follows the player; chasing another NPC needs a plan of its own
+                field = None
+                if CHASE_PLANNER != "incremental" and getattr(target, 'is_player', False):
+                    # One field per map towards the target, shared by all chasers; None where the map keeps none
+                    field = self.entity.map.flow_field_to(target)
+                if field is not None:
+                    next_node = field.next_step(self.entity)
+                else:
+                    if self.planner is None:
+                        self.planner = IncrementalPlanner(self.entity.map)
+                    next_node = self.planner.next_step(self.entity, target)
+                if next_node:
+                    return next_node
         return self._wander()
         
     def _wander(self):
@@ -232,6 +301,8 @@ class MoveAI:
         return (self.entity.x, self.entity.y)
 
 class Goblin(NPC):
+    __slots__ = ()
+
     def __init__(self, x, y, map_obj):
         gear = []
         if random.random() > 0.5:
@@ -240,11 +311,15 @@ class Goblin(NPC):
         self.color = COLORS["RED"]
 
 class Ghost(NPC):
+    __slots__ = ()
+
     def __init__(self, x, y, map_obj):
         super().__init__(x, y, '?', 'aggressive', map_obj, 15, 1, 15, [], [])
         self.color = COLORS["GREY"]
 
 class Human(NPC):
+    __slots__ = ()
+
     def __init__(self, x, y, map_obj):
         super().__init__(x, y, 'H', 'passive', map_obj, 5, 1, 10, [], [])
         self.color = COLORS["WHITE"]
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Line of sight over a map's opaque terrain (Wall, Tree).
+
+FieldOfView runs recursive shadowcasting from an origin cell out to a
+square radius (the Chebyshev box NPC vision has always used) and caches the
+result per (origin, radius) as a bitmap of that window. The cache follows
+the map's terrain_log: entries whose window contains a cell whose opacity
+changed are dropped, everything else stays valid.
+"""
+from collections import OrderedDict
+from settings import FOV_CACHE_SIZE
+from world import TERRAIN
+
+# (xx, xy, yx, yy) transforms mapping the first octant onto all eight
+OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+           (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+class FieldOfView:
+    def __init__(self, map_obj, max_entries: int = FOV_CACHE_SIZE):
+        self.map = map_obj
+        self.max_entries = max_entries
+        self.cache = OrderedDict()  # (origin cord, radius) -> bytearray window, least recently used first
+        self.opaque = bytearray()
+        self.terrain_version = -1
+        self.hits = 0
+        self.misses = 0
+        self.rebuild()
+
+    def rebuild(self):
+        self.terrain_version = self.map.terrain_log.version
+        self.opaque = bytearray(self.map.terrain).translate(TERRAIN.opaque_table())
+        self.cache.clear()
+
+    def sync(self):
+        log = self.map.terrain_log
+        if log.version == self.terrain_version:
+            return
+        changed = log.since(self.terrain_version)
+        if changed is None:
+            self.rebuild()
+            return
+        self.terrain_version = log.version
+        width = self.map.width
+        for cord in changed:
+            opaque = TERRAIN.opaque[self.map.terrain[cord]]
+            if self.opaque[cord] == opaque:
+                continue
+            self.opaque[cord] = opaque
+            x, y = cord % width, cord // width
+            for key in [key for key in self.cache
+                        if abs(key[0] % width - x) <= key[1] and abs(key[0] // width - y) <= key[1]]:
+                del self.cache[key]
+
+    def visible(self, x: int, y: int, radius: int) -> bytearray:
+        """Window of (2 * radius + 1) ** 2 bytes around (x, y); 1 where the cell is in sight."""
+        self.sync()
+        key = (x + y * self.map.width, radius)
+        window = self.cache.get(key)
+        if window is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return window
+        self.misses += 1
+        window = self._compute(x, y, radius)
+        self.cache[key] = window
+        if len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return window
+
+    def can_see(self, x: int, y: int, target_x: int, target_y: int, radius: int) -> bool:
+        dx, dy = target_x - x, target_y - y
+        if abs(dx) > radius or abs(dy) > radius:
+            return False
+        side = 2 * radius + 1
+        return self.visible(x, y, radius)[(dy + radius) * side + dx + radius] == 1
+
+    def _compute(self, x: int, y: int, radius: int) -> bytearray:
+        side = 2 * radius + 1
+        window = bytearray(side * side)
+        window[radius * side + radius] = 1
+        for octant in OCTANTS:
+            self._cast(window, x, y, radius, 1, 1.0, 0.0, octant)
+        return window
+
+    def _cast(self, window: bytearray, origin_x: int, origin_y: int, radius: int, row: int,
+              start: float, end: float, octant: tuple):
+        """Lights one octant from row outwards between the start and end slopes (recursive shadowcasting)."""
+        if start < end:
+            return
+        xx, xy, yx, yy = octant
+        width, height = self.map.width, self.map.height
+        opaque = self.opaque
+        side = 2 * radius + 1
+        new_start = start
+        for distance in range(row, radius + 1):
+            blocked = False
+            dy = -distance
+            for dx in range(-distance, 1):
+                left_slope = (dx - 0.5) / (dy + 0.5)
+                right_slope = (dx + 0.5) / (dy - 0.5)
+                if start < right_slope:
+                    continue
+                if end > left_slope:
+                    break
+                offset_x = dx * xx + dy * xy
+                offset_y = dx * yx + dy * yy
+                map_x, map_y = origin_x + offset_x, origin_y + offset_y
+                inside = 0 <= map_x < width and 0 <= map_y < height
+                if inside:
+                    window[(offset_y + radius) * side + offset_x + radius] = 1
+                wall = not inside or opaque[map_x + map_y * width]
+                if blocked:
+                    if wall:
+                        new_start = right_slope
+                    else:
+                        blocked = False
+                        start = new_start
+                elif wall and distance < radius:
+                    blocked = True
+                    self._cast(window, origin_x, origin_y, radius, distance + 1, start, left_slope, octant)
+                    new_start = right_slope
+            if blocked:
+                break
+
+    def stats(self) -> dict:
+        return {"entries": len(self.cache), "hits": self.hits, "misses": self.misses}
@@ -1,6 +1,5 @@
 import pygame
-from settings import COLORS, PANEL_WIDTH
-from combat import Fight
+from settings import COLORS, PANEL_WIDTH, FIGHT_RANGE
 # --- FIX: Import from world, not blocks ---
 from world import ItemsPile, Chest
 # ------------------------------------------
@@ -67,6 +66,7 @@ class LootState(GameState):
     def update(self): pass
 
     def draw(self):
+        self.game.world_renderer.invalidate()  # the overlay below is redrawn over the whole view
         self.game.draw_world_only()
         name = "CHEST" if isinstance(self.container, Chest) else "LOOT PILE"
         self.game.ui.draw_loot_interface(self.container, name)
@@ -130,6 +130,7 @@ class InventoryState(GameState):
     def update(self): pass
 
     def draw(self):
+        self.game.world_renderer.invalidate()  # the overlay below is redrawn over the whole view
         self.game.draw_world_only()
         self.game.ui.draw_equip_menu()
         if self.hovered_item:
@@ -156,6 +157,8 @@ class RoamingState(GameState):
                 if event.key == pygame.K_e: self.game.interact_environment()
                 if event.key == pygame.K_t: self.game.interact_loot()
                 if event.key == pygame.K_i: self.game.change_state(InventoryState(self.game))
+                if event.key == pygame.K_F5: self.game.save_game()
+                if event.key == pygame.K_F9: self.game.load_game()
                 
                 if event.key == pygame.K_1: self.game.player.trigger_hotbar(0)
                 if event.key == pygame.K_2: self.game.player.trigger_hotbar(1)
@@ -178,44 +181,56 @@ class RoamingState(GameState):
     
     def draw(self):
         self.game.draw_world_only()
-        self.game.ui.draw()
+        self.game.mark_dirty(self.game.ui.draw())
 
 class CombatState(GameState):
-    def __init__(self, game):
+    """
+    The player's side of a fight. The fight itself is run by the map's
+    FightManager, which may merge it with or split it from others, so the
+    state always follows player.fight.
+    """
+    def __init__(self, game, fight=None):
         super().__init__(game)
-        self.fight = Fight(game.current_map, game.ui, game.player)
-        self.game.player.fight = self.fight
+        if fight is not None:
+            # Resuming a fight restored from a save game
+            return
         
         # Track enemies found to select best target
         enemies_in_range = []
         
-        for entity in game.current_map.entities:
-            is_hostile = False
-            if hasattr(entity, 'attitude') and entity.attitude == 'aggressive':
-                is_hostile = True
-            if hasattr(entity, 'target') and entity.target == game.player:
-                is_hostile = True
-            if hasattr(entity, 'attitude') and entity.attitude == 'passive':
-                is_hostile = False
-            
-            if is_hostile:
-                dist_x = abs(entity.x - game.player.x)
-                dist_y = abs(entity.y - game.player.y)
-                if dist_x <= 10 and dist_y <= 10:
-                    self.fight.add_party(entity)
-                    enemies_in_range.append(entity)
+        for entity in game.current_map.entities_within(game.player.x, game.player.y, FIGHT_RANGE):
+            if self.is_hostile(entity):
+                game.current_map.fights.engage(entity, game.player, game.ui)
+                enemies_in_range.append(entity)
         
+        if self.fight is None:
+            game.player.in_fight = False
+            game.change_state(RoamingState(game))
+            return
+        self.fight.ui_panel = game.ui
         if enemies_in_range:
             game.ui.add_message(f"Combat started!", COLORS["RED"])
             
             if not game.player.target or game.player.target not in enemies_in_range:
                 # Pick nearest
-                enemies_in_range.sort(key=lambda e: abs(e.x - game.player.x) + abs(e.y - game.player.y))
-                game.player.target = enemies_in_range[0]
-                game.ui.add_message(f"Auto-target: {game.player.target.symbol}", COLORS["GREEN"])
-        else:
-            game.player.in_fight = False
-            game.change_state(RoamingState(game))
+                nearest = game.current_map.nearest_entity(game.player.x, game.player.y, FIGHT_RANGE, self.is_hostile)
+                if nearest is not None:
+                    game.player.target = nearest
+                    game.ui.add_message(f"Auto-target: {nearest.symbol}", COLORS["GREEN"])
+
+    @property
+    def fight(self):
+        return self.game.player.fight
+
+    def is_hostile(self, entity):
+        is_hostile = False
+        if hasattr(entity, 'attitude') and entity.attitude == 'aggressive':
+            is_hostile = True
+        if hasattr(entity, 'target') and entity.target == self.game.player:
+            is_hostile = True
+        if hasattr(entity, 'attitude') and entity.attitude == 'passive':
+            is_hostile = False
+        return is_hostile
 
     def handle_input(self, events):
         direction = self.game.ui.get_mouse_direction()
@@ -253,13 +268,7 @@ class CombatState(GameState):
                 if event.key == pygame.K_5: self.game.player.trigger_hotbar(4)
 
     def update(self):
-        self.fight.update_distances(self.game.player)
-        self.fight.npc_ai_logic(self.game.current_time)
-        for event in self.game.current_map.events[:]:
-            if event.process(self.game.current_time):
-                self.game.current_map.events.remove(event)
-
-        if len(self.fight.party) <= 1:
+        if self.fight is None or len(self.fight.party) <= 1:
             self.game.player.in_fight = False
             self.game.player.fight = None
             self.game.change_state(RoamingState(self.game))
@@ -267,4 +276,4 @@ class CombatState(GameState):
             
     def draw(self):
         self.game.draw_world_only()
-        self.game.ui.draw(self.fight)
\ No newline at end of file
+        self.game.mark_dirty(self.game.ui.draw(self.fight))
\ No newline at end of file
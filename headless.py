@@ -0,0 +1,70 @@
+"""
+Runs the game simulation without a window, driven by a virtual clock.
+
+    python headless.py --seconds 600 --seed 1
+    python headless.py --seconds 60 --profile trace.json   # also write a Chrome trace
+"""
+import argparse
+import random
+import time
+import timing
+from settings import FPS
+
+class HeadlessRunner:
+    """Builds a full Game off-screen and fast-forwards it in fixed frame steps."""
+    def __init__(self, seed=None, step_ms: int = 1000 // FPS, enter_location: bool = True):
+        from main import Game
+
+        random.seed(seed)
+        self.step_ms = step_ms
+        self.clock = timing.VirtualClock()
+        timing.set_clock(self.clock)
+        self.game = Game(headless=True)
+        if enter_location:
+            self.game.interact_environment()
+
+    def advance(self, seconds: float) -> dict:
+        """Simulates `seconds` of game time as fast as possible and reports throughput."""
+        frames = int(seconds * 1000 // self.step_ms)
+        ticks = 0
+        started = time.perf_counter()
+        for _ in range(frames):
+            if not self.game.running:
+                break
+            self.clock.advance(self.step_ms)
+            self.game.step([])
+            ticks += 1
+        wall = time.perf_counter() - started
+        simulated = ticks * self.step_ms / 1000
+        return {
+            "ticks": ticks,
+            "simulated_seconds": simulated,
+            "wall_seconds": wall,
+            "ticks_per_second": ticks / wall if wall else 0.0,
+            "speedup": simulated / wall if wall else 0.0,
+            "running": self.game.running,
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the game simulation headless.")
+    parser.add_argument("--seconds", type=float, default=60, help="simulated seconds to advance")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--step-ms", type=int, default=1000 // FPS, help="simulated milliseconds per tick")
+    parser.add_argument("--world", action="store_true", help="stay on the world map instead of entering a Location")
+    parser.add_argument("--profile", metavar="TRACE_PATH", help="profile the run and write a Chrome trace here")
+    args = parser.parse_args()
+
+    runner = HeadlessRunner(args.seed, args.step_ms, enter_location=not args.world)
+    if args.profile:
+        from profiler import PROFILER, FRAME
+        PROFILER.enable()
+    report = runner.advance(args.seconds)
+    print(f"{report['ticks']} ticks, {report['simulated_seconds']:.1f}s simulated in {report['wall_seconds']:.2f}s "
+          f"({report['ticks_per_second']:.0f} ticks/s, {report['speedup']:.1f}x real time)")
+    if not report["running"]:
+        print("Game ended during the run.")
+    if args.profile:
+        print("{:<32}{:>10}{:>10}{:>10}".format("ms per frame", "p50", "p95", "p99"))
+        for name in [FRAME] + PROFILER.phases():
+            print("{:<32}{:>10.3f}{:>10.3f}{:>10.3f}".format(name, *PROFILER.percentiles(name)))
+        print(f"{PROFILER.export(args.profile)} spans written to {args.profile}")
@@ -0,0 +1,119 @@
+"""
+The player's bag.
+
+Inventory keeps the carried items in pick-up order, the order the UI grids
+and the save file's indexes use, plus the indexes the game asks about every
+frame: membership by identity, a bucket of items per item class, the open
+stack of every stackable template and the running coin total. Stackable
+items (potions, coins) merge into the stack of their template, so one slot
+holds a count instead of many copies.
+
+Listeners registered with subscribe() are called as listener(item, delta)
+after every change, delta being the units added (positive) or taken out
+(negative), so the win check and the UI react to changes instead of
+scanning the bag each frame. Counts must change through the inventory for
+the indexes and listeners to see them.
+"""
+from items import Coins
+
+class Inventory:
+    __slots__ = ('items', 'ids', 'buckets', 'stacks', 'coins', 'listeners')
+
+    def __init__(self, items=()):
+        self.items = []
+        self.ids = set()      # id() of every held item
+        self.buckets = {}     # item class -> held items of exactly that class
+        self.stacks = {}      # ItemTemplate -> the held stack of a stackable item
+        self.coins = 0
+        self.listeners = []
+        self.extend(items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __contains__(self, item) -> bool:
+        return id(item) in self.ids
+
+    def index(self, item) -> int:
+        return self.items.index(item)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def _notify(self, item, delta: int):
+        for listener in self.listeners:
+            listener(item, delta)
+
+    def of_type(self, cls) -> list:
+        """Held items whose class is exactly cls."""
+        return self.buckets.get(cls, [])
+
+    def first(self, cls):
+        bucket = self.buckets.get(cls)
+        return bucket[0] if bucket else None
+
+    def add(self, item):
+        """Puts item in the bag and returns the item now holding it: its stack, or item itself."""
+        if item.STACKABLE:
+            stack = self.stacks.get(item.template)
+            if stack is not None and stack is not item:
+                stack.count += item.count
+                if isinstance(stack, Coins):
+                    self.coins += item.count
+                self._notify(stack, item.count)
+                return stack
+        if id(item) in self.ids:
+            return item
+        self.items.append(item)
+        self.ids.add(id(item))
+        self.buckets.setdefault(type(item), []).append(item)
+        if item.STACKABLE:
+            self.stacks[item.template] = item
+        if isinstance(item, Coins):
+            self.coins += item.count
+        self._notify(item, item.count)
+        return item
+
+    append = add
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+
+    def remove(self, item):
+        """Takes the whole stack item out of the bag; ValueError if it is not held."""
+        if id(item) not in self.ids:
+            raise ValueError(f"{item.name} is not in the inventory")
+        self.items.remove(item)
+        self.ids.discard(id(item))
+        self.buckets[type(item)].remove(item)
+        if self.stacks.get(item.template) is item:
+            del self.stacks[item.template]
+        if isinstance(item, Coins):
+            self.coins -= item.count
+        self._notify(item, -item.count)
+
+    def take(self, item, count: int = 1):
+        """Uses up count units of the stack item, removing it once it is empty."""
+        if count >= item.count:
+            self.remove(item)
+            return
+        if id(item) not in self.ids:
+            raise ValueError(f"{item.name} is not in the inventory")
+        item.count -= count
+        if isinstance(item, Coins):
+            self.coins -= count
+        self._notify(item, -count)
+
+    def clear(self):
+        for item in list(self.items):
+            self.remove(item)
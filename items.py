@@ -1,49 +1,142 @@
 from typing import Optional
 from settings import COLORS
 
-class Item:
-    """Base class for all collectable items."""
-    def __init__(self, name: str, damage: int, protection: int, price: int, symbol: str, equipped: bool = False):
+class ItemTemplate:
+    """What every item of one kind shares: its stats, value and look. Interned through item_template()."""
+    __slots__ = ('kind', 'name', 'damage', 'protection', 'price', 'symbol', 'color')
+
+    def __init__(self, kind: type, name: str, damage: int, protection: int, price: int, symbol: str, color: tuple):
+        self.kind = kind
         self.name = name
         self.damage = damage
         self.protection = protection
         self.price = price
         self.symbol = symbol
+        self.color = color
+
+# Equipment slots of a LivingEntity, and the slot a hit from each of the five
+# fight directions lands on: head, body, legs, legs, body.
+WEAPON, HELMET, BREASTPLATE, LEGGINGS = range(4)
+EQUIPMENT_SLOTS = 4
+DIRECTION_SLOTS = (HELMET, BREASTPLATE, LEGGINGS, LEGGINGS, BREASTPLATE)
+
+ITEM_TEMPLATES = {}  # (item class, name, damage, protection, price, symbol) -> ItemTemplate
+
+def item_template(kind: type, name: str, damage: int, protection: int, price: int, symbol: str) -> ItemTemplate:
+    key = (kind, name, damage, protection, price, symbol)
+    template = ITEM_TEMPLATES.get(key)
+    if template is None:
+        template = ITEM_TEMPLATES[key] = ItemTemplate(kind, name, damage, protection, price, symbol, kind.COLOR)
+    return template
+
+class Item:
+    """
+    Base class for all collectable items. An item only holds its own state
+    (equipped flag and stack count); everything else is read from its shared
+    template.
+    """
+    __slots__ = ('template', 'equipped', 'count')
+    COLOR = COLORS["WHITE"]
+    STACKABLE = False  # identical items merge into one stack in an Inventory
+    SLOT = None        # equipment slot the item is worn in, if any
+
+    def __init__(self, name: str, damage: int, protection: int, price: int, symbol: str, equipped: bool = False):
+        self.template = item_template(type(self), name, damage, protection, price, symbol)
         self.equipped = equipped
-        self.color = COLORS["WHITE"]
-        
-        if self.equipped:
-            self.color = COLORS["PURPLE"]
+        self.count = 1
+
+    @classmethod
+    def from_template(cls, template: ItemTemplate, equipped: bool = False, count: int = 1):
+        item = cls.__new__(cls)
+        item.template = template
+        item.equipped = equipped
+        item.count = count
+        return item
+
+    @property
+    def name(self) -> str:
+        return self.template.name
+
+    @property
+    def damage(self) -> int:
+        return self.template.damage
+
+    @property
+    def protection(self) -> int:
+        return self.template.protection
+
+    @property
+    def price(self) -> int:
+        """Value of the whole stack."""
+        return self.template.price * self.count
+
+    @property
+    def symbol(self) -> str:
+        return self.template.symbol
+
+    @property
+    def color(self) -> tuple:
+        return COLORS["PURPLE"] if self.equipped else self.template.color
 
     def __str__(self):
         return self.symbol
 
 class Potion(Item):
+    __slots__ = ()
+    STACKABLE = True
+
     def __init__(self, name: str, protection: int = 0, price: int = 10, equipped: bool = False):
         super().__init__(name, 0, 0, price, '6', equipped)
 
 class Equipment(Item):
     """Base class for wearable items."""
+    __slots__ = ()
+
     def __init__(self, name: str, protection: int, price: int, symbol: str, equipped: bool):
         super().__init__(name, 0, protection, price, symbol, equipped)
 
 class Helmet(Equipment):
+    __slots__ = ()
+    SLOT = HELMET
+
     def __init__(self, name: str, protection: int, price: int, equipped: bool):
         super().__init__(name, protection, price, 'H', equipped)
 
 class BreastPlate(Equipment):
+    __slots__ = ()
+    SLOT = BREASTPLATE
+
     def __init__(self, name: str, protection: int, price: int, equipped: bool):
         super().__init__(name, protection, price, 'B', equipped)
 
 class Leggings(Equipment):
+    __slots__ = ()
+    SLOT = LEGGINGS
+
     def __init__(self, name: str, protection: int, price: int, equipped: bool):
         super().__init__(name, protection, price, 'L', equipped)
 
 class Sword(Item):
+    __slots__ = ()
+    SLOT = WEAPON
+
     def __init__(self, name: str, damage: int, price: int, equipped: bool):
         super().__init__(name, damage, 0, price, 'S', equipped)
 
 class Coins(Item):
+    """A stack of coins worth one each; price is the amount."""
+    __slots__ = ()
+    COLOR = COLORS["GOLD"]
+    STACKABLE = True
+
     def __init__(self, name: str, price: int):
-        super().__init__(name, 0, 0, price, 'c', False)
-        self.color = COLORS["GOLD"]
\ No newline at end of file
+        super().__init__(name, 0, 0, 1, 'c', False)
+        self.count = price
+
+    @property
+    def price(self) -> int:
+        return self.count
+
+    @price.setter
+    def price(self, value: int):
+        self.count = value
@@ -0,0 +1,155 @@
+import os
+import tempfile
+import time
+from collections import OrderedDict
+import persist
+import timing
+from settings import LOCATION_STORE_BUDGET, LOCATION_STORE_DIR
+from spatial import SpatialIndex
+from scheduler import TimerQueue, EventQueue
+from combat import FightManager
+
+class LocationStore:
+    """
+    Keeps the most recently entered Locations in memory while their estimated
+    size (Map.memory_bytes) fits the byte budget, and pages the rest out to
+    disk. A paged-out Location object stays on the world map as a marker with
+    its grid, objects and entities released; enter() reads them back in place,
+    so callers keep using the same object.
+    """
+    def __init__(self, budget: int = LOCATION_STORE_BUDGET, directory: str = LOCATION_STORE_DIR):
+        self.budget = budget
+        self._tempdir = None
+        if directory is None:
+            self._tempdir = tempfile.TemporaryDirectory(prefix="rpg-locations-")
+            directory = self._tempdir.name
+        self.directory = directory
+        self.resident = OrderedDict()  # Location -> None, least recently entered first
+        self.paged = {}                # Location -> file holding its state
+        self.pending = {}              # resident Location -> newer state to load on the next enter()
+        self._next_id = 0
+        self.page_outs = 0
+        self.page_ins = 0
+        self.pinned_skips = 0  # evictions skipped because the Location was mid-fight
+        self.bytes_written = 0
+        self.last_page_in_ms = 0.0
+
+    def enter(self, location, player=None) -> list:
+        """Makes location resident and most recently used; returns the Locations paged out to make room."""
+        if location in self.paged:
+            self.page_in(location, player)
+        elif location in self.pending:
+            self._restore(location, self.pending.pop(location), player)
+        self.resident[location] = None
+        self.resident.move_to_end(location)
+
+        paged_out = []
+        resident_bytes = self.resident_bytes()
+        for candidate in list(self.resident):
+            if resident_bytes <= self.budget:
+                break
+            size = candidate.memory_bytes()
+            if candidate is not location and self.page_out(candidate, player):
+                paged_out.append(candidate)
+                resident_bytes -= size
+        return paged_out
+
+    def resident_bytes(self) -> int:
+        return sum(location.memory_bytes() for location in self.resident)
+
+    @staticmethod
+    def is_pageable(location) -> bool:
+        """Pending hits and running fights hold references that cannot be written out."""
+        return not location.events and not any(getattr(entity, 'in_fight', False) for entity in location.entities)
+
+    def page_out(self, location, player=None) -> bool:
+        if not self.is_pageable(location):
+            self.pinned_skips += 1
+            return False
+        if player is not None and player.target in location.entities:
+            player.target = None
+
+        data = self.pending.pop(location, None)
+        if data is None:
+            data = persist.dumps(persist.map_state(location, {player: "player"} if player else None, timing.get_ticks()))
+        self.resident.pop(location, None)
+        self.adopt(location, data)
+        self.page_outs += 1
+        return True
+
+    def adopt(self, location, data: bytes):
+        """Registers location as paged out with data (persist.dumps of its map_state) as its state."""
+        path = os.path.join(self.directory, f"location-{self._next_id}.bin")
+        self._next_id += 1
+        with open(path, "wb") as f:
+            f.write(data)
+        self.paged[location] = path
+        self.bytes_written += len(data)
+        self._release(location)
+
+    def saved_data(self, location):
+        """The stored state of a paged-out Location or a newer pending one, else None (live state is current)."""
+        if location in self.paged:
+            with open(self.paged[location], "rb") as f:
+                return f.read()
+        return self.pending.get(location)
+
+    def replace_state(self, location, data: bytes):
+        """Swaps in a newer state for a Location the player is not in, e.g. from off-screen simulation."""
+        if location in self.paged:
+            with open(self.paged[location], "wb") as f:
+                f.write(data)
+            self.bytes_written += len(data)
+        elif location in self.resident:
+            self.pending[location] = data
+
+    def locations(self) -> list:
+        return list(self.resident) + list(self.paged)
+
+    def page_in(self, location, player=None):
+        started = time.perf_counter()
+        path = self.paged.pop(location)
+        with open(path, "rb") as f:
+            data = f.read()
+        os.remove(path)
+        self._restore(location, data, player)
+        self.page_ins += 1
+        self.last_page_in_ms = (time.perf_counter() - started) * 1000
+
+    @staticmethod
+    def _restore(location, data: bytes, player=None):
+        persist.restore_map(location, persist.loads(data), {"player": player} if player else None, timing.get_ticks())
+
+    @staticmethod
+    def _release(location):
+        location.entities = []
+        location.entity_index = SpatialIndex()
+        location.objects = {}
+        location._blockers = {}
+        location.events = EventQueue()
+        # The queue and fights hold the NPCs too; restore_map rebuilds both on page-in
+        location.update_queue = TimerQueue()
+        location.fights = FightManager(location)
+        location.flow_field = None
+        location.regions = None
+        location.fov = None
+        location.terrain = location.terrain_passability = location.passability = bytearray()
+
+    def stats(self) -> dict:
+        return {
+            "resident": len(self.resident),
+            "paged": len(self.paged),
+            "resident_bytes": self.resident_bytes(),
+            "budget": self.budget,
+            "page_outs": self.page_outs,
+            "page_ins": self.page_ins,
+            "pinned_skips": self.pinned_skips,
+            "bytes_on_disk": sum(os.path.getsize(path) for path in self.paged.values()),
+            "bytes_written": self.bytes_written,
+            "last_page_in_ms": self.last_page_in_ms,
+        }
+
+    def close(self):
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
+            self._tempdir = None
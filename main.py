@@ -1,50 +1,73 @@
+import os
 import pygame
 import sys
-from settings import TILE_SIZE, COLORS, FPS, PANEL_WIDTH
+import timing
+from settings import (TILE_SIZE, COLORS, FPS, PANEL_WIDTH, HEADLESS_SCREEN_SIZE, MAP_WIDTH, MAP_HEIGHT,
+                      WORLD_CHUNKED, CHUNKED_MAP_WIDTH, CHUNKED_MAP_HEIGHT, SAVE_PATH, WIN_COINS,
+                      PROFILE_TRACE_PATH)
 from player import Player
+from entities import AGGRO_DISTANCE
+from chunks import ChunkedWorldMap
 from world import WorldMap, Location, Chest, Village, ForestBlock, Plain, ForestDirt, ItemsPile
 from ui import UI
+from renderer import WorldRenderer
+from location_store import LocationStore
+import savegame
+from offscreen import OffscreenSimulator
+from text_cache import TEXT_CACHE
+from profiler import PROFILER, profiled
 from texts import show_start_screen, show_game_over, show_happy_ending
 from gamestates import RoamingState, CombatState, LootState, InventoryState
 
 class SymbolRenderer:
     def __init__(self, font):
         self.font = font
-        self.cache = {}
 
     def get_surface(self, symbol, color):
-        key = (symbol, color)
-        if key not in self.cache:
-            self.cache[key] = self.font.render(symbol, True, color)
-        return self.cache[key]
+        return TEXT_CACHE.render(self.font, symbol, True, color)
 
 class Game:
-    def __init__(self):
-        pygame.init()
+    def __init__(self, headless: bool = False):
+        self.headless = headless
+        if headless:
+            # No window: draw into an off-screen surface and never touch the display
+            pygame.font.init()
+            self.screen_width, self.screen_height = HEADLESS_SCREEN_SIZE
+            self.screen = pygame.Surface(HEADLESS_SCREEN_SIZE)
+        else:
+            pygame.init()
 
-        info = pygame.display.Info()
-        self.screen_width = info.current_w
-        self.screen_height = info.current_h
-        
-        self.screen = pygame.display.set_mode(
-            (self.screen_width, self.screen_height), 
-            pygame.FULLSCREEN
-        )
+            info = pygame.display.Info()
+            self.screen_width = info.current_w
+            self.screen_height = info.current_h
+            
+            self.screen = pygame.display.set_mode(
+                (self.screen_width, self.screen_height), 
+                pygame.FULLSCREEN
+            )
   
-        pygame.display.set_caption("Retro Python RPG")
+            pygame.display.set_caption("Retro Python RPG")
         
         self.clock = pygame.time.Clock()
         self.running = True
         
         self.map_font = pygame.font.SysFont('Arial', 20)
         self.renderer = SymbolRenderer(self.map_font)
+        self.world_renderer = WorldRenderer(self.renderer)
+        self.dirty_rects = None
 
-        self.world_map = WorldMap(52, 33)
+        if WORLD_CHUNKED:
+            self.world_map = ChunkedWorldMap(CHUNKED_MAP_WIDTH, CHUNKED_MAP_HEIGHT)
+        else:
+            self.world_map = WorldMap(MAP_WIDTH, MAP_HEIGHT)
         self.world_map.generate()
+        self.locations = LocationStore()
         
         self.current_map = self.world_map
         self.player = Player(0, 0, self.current_map)
         self.current_map.add_entity(self.player, 0, 0)
+        self.won = False
+        self.player.items.subscribe(self.on_inventory_change)
         
         self.ui = UI(self.screen, self.player)
         
@@ -53,33 +76,93 @@ class Game:
 
         self.last_world_pos = (0, 0)
         self.last_move = 0
+        self.current_time = timing.get_ticks()
 
         self.state = RoamingState(self)
+        self.show_profile = False
+        self.autosaver = None if headless else savegame.Autosaver(self)
+        self.offscreen = None if headless else OffscreenSimulator(self)
 
-        show_start_screen(self.screen)
+        if not headless:
+            show_start_screen(self.screen)
 
     def change_state(self, new_state):
         self.state = new_state
+        self.world_renderer.invalidate()
+
+    def mark_dirty(self, rects):
+        """Adds screen rects to update this frame; None means the whole screen."""
+        if rects is None:
+            self.dirty_rects = None
+        elif self.dirty_rects is not None:
+            self.dirty_rects.extend(rects)
 
     def run(self):
         while self.running:
-            self.current_time = pygame.time.get_ticks()
+            self.step(pygame.event.get())
+            self.clock.tick(FPS)
 
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
-                    self.running = False
+        self.autosaver.close()
+        self.offscreen.close()
+        self.locations.close()
+        pygame.quit()
+        sys.exit()
 
-                if event.type == pygame.KEYDOWN and event.key == pygame.K_x:
-                     self.running = False
+    def step(self, events):
+        """Advances the game by one frame at the current game time."""
+        PROFILER.begin_frame()
+        self.current_time = timing.get_ticks()
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.running = False
 
-            self.state.handle_input(events)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_x:
+                 self.running = False
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.toggle_profile()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                self.export_profile()
+
+        if not self.headless:
+            with PROFILER.phase("input"):
+                self.state.handle_input(events)
+        with PROFILER.phase("update"):
             self.update()
-            self.draw()
-            self.clock.tick(FPS)
+        if not self.headless:
+            with PROFILER.phase("draw"):
+                self.draw()
+        PROFILER.end_frame()
 
-        pygame.quit()
-        sys.exit()
+    def toggle_profile(self):
+        self.show_profile = not self.show_profile
+        PROFILER.enable(self.show_profile)
+        self.world_renderer.invalidate()  # clears the overlay when it goes away
+
+    def export_profile(self, path: str = PROFILE_TRACE_PATH):
+        if not PROFILER.enabled:
+            self.ui.add_message("Profiler is off (F3)", COLORS["GREY"])
+            return
+        count = PROFILER.export(path)
+        self.ui.add_message(f"Trace: {count} spans to {path}", COLORS["GREEN"])
+
+    def save_game(self, path: str = SAVE_PATH):
+        savegame.save_game(self, path)
+        self.ui.add_message("Game saved", COLORS["GREEN"])
+
+    def load_game(self, path: str = SAVE_PATH):
+        if not os.path.exists(path):
+            self.ui.add_message("No save game", COLORS["GREY"])
+            return
+        elapsed, overrun = savegame.load_game(self, path)
+        if self.player.fight is not None:
+            self.change_state(CombatState(self, self.player.fight))
+        else:
+            self.change_state(RoamingState(self))
+        self.ui.add_message(f"Loaded in {elapsed:.0f} ms", COLORS["GREEN"])
+        if overrun:
+            self.ui.add_message(f"Load {overrun:.0f} ms over budget", COLORS["RED"])
 
     def select_target_at_mouse(self, mx, my):
         cam_x = max(0, min(self.player.x - self.view_w // 2, self.current_map.width - self.view_w))
@@ -88,22 +171,19 @@ class Game:
         click_map_x = int((mx - 10) / TILE_SIZE) + cam_x
         click_map_y = int((my - 10) / TILE_SIZE) + cam_y
         
-        for entity in self.current_map.entities:
-            if entity.x == click_map_x and entity.y == click_map_y:
-                if hasattr(entity, 'is_player') and not entity.is_player:
-                    self.player.target = entity
-                    self.ui.add_message(f"Target: {entity.symbol}", COLORS["GREEN"])
-                    return
+        for entity in self.current_map.entities_at(click_map_x, click_map_y):
+            if hasattr(entity, 'is_player') and not entity.is_player:
+                self.player.target = entity
+                self.ui.add_message(f"Target: {entity.symbol}", COLORS["GREEN"])
+                return
 
     def try_move(self, dx, dy):
         target_x = self.player.x + dx
         target_y = self.player.y + dy
         
         if self.current_map.is_passable(target_x, target_y):
-            self.current_map.remove_entity(self.player)
-            self.player.x = target_x
-            self.player.y = target_y
-            self.current_map.add_entity(self.player, target_x, target_y)
+            self.current_map.move_entity(self.player, target_x, target_y)
+            self.current_map.wake_near(target_x, target_y, AGGRO_DISTANCE - 1, self.current_time)
 
     def interact_loot(self):
         chest = self.current_map.get_object_at(self.player.x, self.player.y, Chest)
@@ -123,7 +203,7 @@ class Game:
                 return
                 
             terrain_obj = None
-            stack = self.current_map.map_list[self.player.cord]
+            stack = self.current_map.get_stack(self.player.cord)
             for obj in reversed(stack):
                 if isinstance(obj, (Village, ForestBlock, Plain, ForestDirt)):
                     terrain_obj = obj
@@ -137,6 +217,7 @@ class Game:
                 return
 
         if isinstance(self.current_map, Location):
+            self.current_map.fights.end_all()
             self.current_map.remove_entity(self.player)
             self.current_map = self.world_map
             self.player.map = self.world_map
@@ -145,64 +226,68 @@ class Game:
             return
 
     def enter_location(self, location_obj):
+        if self.offscreen is not None:
+            self.offscreen.forget(location_obj, self.current_time)
+        for paged_out in self.locations.enter(location_obj, self.player):
+            self.world_renderer.forget(paged_out)
         self.last_world_pos = (self.player.x, self.player.y)
+        self.current_map.fights.end_all()  # only the current map runs fights; the rest is simulated offscreen
         self.current_map.remove_entity(self.player)
         self.current_map = location_obj
         self.player.map = location_obj
-        self.player.x, self.player.y = 1, 1
-        self.current_map.add_entity(self.player, 1, 1)
+        self.player.x, self.player.y = location_obj.ENTRANCE
+        self.current_map.add_entity(self.player, *location_obj.ENTRANCE)
+
+    def on_inventory_change(self, item, delta):
+        self.won = self.player.items.coins >= WIN_COINS
 
     def update(self):
         if not self.player.alive:
-            show_game_over(self.screen)
+            if not self.headless: show_game_over(self.screen)
             self.running = False
             return
 
-        for item in self.player.items:
-            if hasattr(item, 'price') and item.name == 'coins' and item.price >= 10000:
-                show_happy_ending(self.screen)
-                self.running = False
-                return
+        if self.won:
+            if not self.headless: show_happy_ending(self.screen)
+            self.running = False
+            return
+
+        if self.autosaver is not None:
+            self.autosaver.tick(self.current_time)
+        if self.offscreen is not None:
+            self.offscreen.tick(self.current_time)
+
+        if hasattr(self.current_map, 'stream_around'):
+            self.current_map.stream_around(self.player.x, self.player.y, max(self.view_w, self.view_h))
 
-        for entity in self.current_map.entities:
-            if hasattr(entity, 'update'):
-                entity.update(self.current_time, self.player)
+        with PROFILER.phase("entities"):
+            self.current_map.update_entities(self.current_time, self.player)
+        with PROFILER.phase("events"):
+            self.current_map.events.run_due(self.current_time)
+        with PROFILER.phase("fights"):
+            self.current_map.fights.tick(self.current_time)
 
-        self.state.update()
+        with PROFILER.phase("state"):
+            self.state.update()
 
+    @profiled("draw_world_only")
     def draw_world_only(self):
-        self.screen.fill(COLORS["BLACK"])
-        
         cam_x = max(0, min(self.player.x - self.view_w // 2, self.current_map.width - self.view_w))
         cam_y = max(0, min(self.player.y - self.view_h // 2, self.current_map.height - self.view_h))
         
-        for y in range(cam_y, min(cam_y + self.view_h, self.current_map.height)):
-            for x in range(cam_x, min(cam_x + self.view_w, self.current_map.width)):
-                
-                screen_x = (x - cam_x) * TILE_SIZE + 10
-                screen_y = (y - cam_y) * TILE_SIZE + 10
-                
-                if self.current_map.check_cords(x, y):
-                    stack = self.current_map.map_list[x + y * self.current_map.width]
-                    if stack:
-                        top_obj = stack[-1]
-                        if isinstance(top_obj, Location):
-                            if len(stack) > 1: top_obj = stack[-2]
-                            else: continue
-
-                        color = getattr(top_obj, 'color', COLORS["WHITE"])
-                        if str(top_obj) == '@': color = COLORS["WHITE"]
-                        elif str(top_obj) == 'G': color = COLORS["RED"]
-                        
-                        if hasattr(self.player, 'target') and top_obj == self.player.target:
-                            pygame.draw.rect(self.screen, (50, 0, 0), (screen_x, screen_y, TILE_SIZE, TILE_SIZE))
-
-                        text = self.renderer.get_surface(str(top_obj), color)
-                        self.screen.blit(text, (screen_x, screen_y))
+        self.mark_dirty(self.world_renderer.draw(
+            self.screen, self.current_map, cam_x, cam_y, self.view_w, self.view_h, self.player.target
+        ))
 
     def draw(self):
+        self.dirty_rects = []
         self.state.draw()
-        pygame.display.flip()
+        if self.show_profile:
+            self.mark_dirty([self.ui.draw_profile(PROFILER)])
+        if self.dirty_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.dirty_rects)
 
 if __name__ == "__main__":
     game = Game()
@@ -0,0 +1,131 @@
+"""
+Coarse background simulation of the Locations the player is not in.
+
+Every OFFSCREEN_INTERVAL_MS the Game hands the saved state of each inactive
+Location to a process pool. A worker advances it in OFFSCREEN_TICK_MS steps,
+with NPCs wandering, monsters attacking adjacent villagers and monsters
+respawning. The new state goes back into the LocationStore, and the player
+sees it the next time they enter that Location.
+"""
+import random
+from concurrent.futures import ProcessPoolExecutor
+import persist
+import timing
+from combat import Fight, Hit, NoMessages
+from entities import NPC, Goblin, Ghost
+from world import Location
+from settings import (OFFSCREEN_INTERVAL_MS, OFFSCREEN_TICK_MS, OFFSCREEN_MAX_CATCHUP_MS, OFFSCREEN_WORKERS,
+                      OFFSCREEN_MIN_MONSTERS, OFFSCREEN_RESPAWN_CHANCE)
+
+def _foe_of(npc, location):
+    target = npc.target
+    if target is not None and target.alive and target in location.entity_index \
+            and abs(target.x - npc.x) <= 1 and abs(target.y - npc.y) <= 1:
+        return target
+    if npc.attitude != 'aggressive':
+        return None
+    for other in location.entities_within(npc.x, npc.y, 1):
+        if other is not npc and getattr(other, 'attitude', None) == 'passive' and other.alive:
+            return other
+    return None
+
+def _strike(attacker, defender, location, now: int):
+    """One blow with the normal combat rules: random stances, so a fifth of them are blocked."""
+    panel = NoMessages()
+    fight = Fight(location, panel, attacker, defender)
+    Hit(fight, attacker, defender, 0, now, panel).resolve_damage()
+    attacker.last_hit_time = now
+
+def simulate_tick(location, now: int):
+    for npc in [entity for entity in location.entities if isinstance(entity, NPC)]:
+        if not npc.alive:
+            continue
+        foe = _foe_of(npc, location)
+        if foe is not None:
+            if npc.can_hit:
+                _strike(npc, foe, location, now)
+        elif npc.can_move:
+            npc.last_moved = now
+            location.move_entity(npc, *npc.move_ai._wander())
+
+    monsters = sum(1 for entity in location.entities if getattr(entity, 'attitude', None) == 'aggressive')
+    if monsters < OFFSCREEN_MIN_MONSTERS and random.random() < OFFSCREEN_RESPAWN_CHANCE:
+        x, y = random.randrange(location.width), random.randrange(location.height)
+        if location.is_passable(x, y) and location.region_at(x, y) == location.spawn_region():
+            location.add_entity(random.choice([Goblin, Ghost])(x, y, location), x, y)
+
+def simulate_location(data: bytes, elapsed_ms: int, seed: int) -> bytes:
+    """Process pool entry point: advances a LocationStore blob by elapsed_ms and returns the new blob."""
+    random.seed(seed)
+    clock = timing.VirtualClock()
+    timing.set_clock(clock)
+    location = Location([], generate=False)
+    persist.restore_map(location, persist.loads(data))
+    for _ in range(elapsed_ms // OFFSCREEN_TICK_MS):
+        clock.advance(OFFSCREEN_TICK_MS)
+        simulate_tick(location, clock.get_ticks())
+    return persist.dumps(persist.map_state(location, now=clock.get_ticks()))
+
+class OffscreenSimulator:
+    """Schedules simulate_location jobs for inactive Locations and merges finished ones into the store."""
+    def __init__(self, game, interval_ms: int = OFFSCREEN_INTERVAL_MS, workers: int = OFFSCREEN_WORKERS):
+        self.game = game
+        self.interval_ms = interval_ms
+        self.workers = workers
+        self.executor = None  # started on the first batch, so short sessions never fork
+        self.next_batch = timing.get_ticks() + interval_ms
+        self.in_flight = {}       # Location -> future
+        self.last_simulated = {}  # Location -> game time its state was last advanced to
+        self.jobs = 0
+        self.merged = 0
+        self.discarded = 0
+
+    def tick(self, now: int):
+        self._collect()
+        if now < self.next_batch:
+            return
+        self.next_batch = now + self.interval_ms
+        store = self.game.locations
+        for location in store.locations():
+            if location is self.game.current_map:
+                self.last_simulated[location] = now  # lived through in real time
+                continue
+            if location in self.in_flight:
+                continue
+            elapsed = min(now - self.last_simulated.get(location, now - self.interval_ms), OFFSCREEN_MAX_CATCHUP_MS)
+            if elapsed < OFFSCREEN_TICK_MS:
+                continue
+            data = store.saved_data(location)
+            if data is None:
+                if not store.is_pageable(location):
+                    continue
+                data = persist.dumps(persist.map_state(location, {self.game.player: "player"}, now))
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.in_flight[location] = self.executor.submit(simulate_location, data, elapsed, random.getrandbits(32))
+            self.last_simulated[location] = now
+            self.jobs += 1
+
+    def _collect(self):
+        for location, future in list(self.in_flight.items()):
+            if not future.done():
+                continue
+            del self.in_flight[location]
+            if future.exception() is None:
+                self.game.locations.replace_state(location, future.result())
+                self.merged += 1
+            else:
+                self.discarded += 1
+
+    def forget(self, location, now: int):
+        """Drops any running job for location; its result would overwrite what the player does there."""
+        if self.in_flight.pop(location, None) is not None:
+            self.discarded += 1
+        self.last_simulated[location] = now
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self.in_flight), "jobs": self.jobs, "merged": self.merged, "discarded": self.discarded}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
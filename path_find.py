@@ -1,56 +1,513 @@
+import heapq
+from array import array
 from collections import deque
+from profiler import profiled
+
+def neighbor_cords(cord: int, width: int, height: int):
+    # Same order as the original BFS: down, up, right, left
+    x = cord % width
+    if cord + width < width * height: yield cord + width
+    if cord >= width: yield cord - width
+    if x + 1 < width: yield cord + 1
+    if x > 0: yield cord - 1
+
+class RegionLabels:
+    """
+    Connected-component labels of a map's terrain passability (4-directional,
+    like the searches). Cells sharing a non-zero label reach each other; 0
+    marks impassable terrain. Kept current from the map's terrain_log: an
+    opened cell joins or merges its neighbours' regions, and a closed cell
+    only triggers a flood when its open neighbours may have been cut apart.
+    """
+    def __init__(self, map_obj):
+        self.map = map_obj
+        self.labels = array('I', [0]) * (map_obj.width * map_obj.height)
+        self.sizes = {}  # label -> number of cells
+        self._next_label = 1
+        self.terrain_version = -1
+        self.floods = 0  # relabelling floods run since the last rebuild
+        self.sync()
+
+    def sync(self):
+        log = self.map.terrain_log
+        changed = log.since(self.terrain_version)
+        if changed is None:
+            self.rebuild()
+            return
+        self.terrain_version = log.version
+        passable = self.map.terrain_passability
+        labels = self.labels
+        for cord in changed:
+            if passable[cord] and not labels[cord]:
+                self._open(cord)
+            elif not passable[cord] and labels[cord]:
+                self._close(cord)
+
+    def rebuild(self):
+        self.terrain_version = self.map.terrain_log.version
+        labels = self.labels = array('I', [0]) * (self.map.width * self.map.height)
+        self.sizes = {}
+        self._next_label = 1
+        self.floods = 0
+        passable = self.map.terrain_passability
+        for cord in range(len(labels)):
+            if passable[cord] and not labels[cord]:
+                self._flood(cord, 0, self._new_label())
+
+    def _new_label(self) -> int:
+        label = self._next_label
+        self._next_label += 1
+        return label
+
+    def _flood(self, start: int, old: int, new: int) -> int:
+        """Relabels the cells labelled old that are connected to start; returns how many."""
+        labels = self.labels
+        width = self.map.width
+        passable = self.map.terrain_passability
+        size = len(labels)
+        labels[start] = new
+        stack = [start]
+        count = 0
+        while stack:
+            cord = stack.pop()
+            count += 1
+            x = cord % width
+            for n in (cord + width if cord + width < size else -1, cord - width,
+                      cord + 1 if x + 1 < width else -1, cord - 1 if x else -1):
+                if n >= 0 and labels[n] == old and (old or passable[n]):
+                    labels[n] = new
+                    stack.append(n)
+        self.sizes[new] = self.sizes.get(new, 0) + count
+        return count
+
+    def _open(self, cord: int):
+        labels = self.labels
+        around = {labels[n] for n in neighbor_cords(cord, self.map.width, self.map.height)} - {0}
+        if not around:
+            label = self._new_label()
+            labels[cord] = label
+            self.sizes[label] = 1
+            return
+        label = max(around, key=self.sizes.__getitem__)
+        labels[cord] = label
+        self.sizes[label] += 1
+        for other in around - {label}:
+            seed = next(n for n in neighbor_cords(cord, self.map.width, self.map.height) if labels[n] == other)
+            self.floods += 1
+            self._flood(seed, other, label)
+            del self.sizes[other]
+
+    def _close(self, cord: int):
+        labels = self.labels
+        label = labels[cord]
+        labels[cord] = 0
+        self.sizes[label] -= 1
+        if not self.sizes[label]:
+            del self.sizes[label]
+            return
+        if self._ring_connected(cord):
+            return
+        # Flood all but one of the pieces the open neighbours may now belong to
+        pieces = [n for n in neighbor_cords(cord, self.map.width, self.map.height) if labels[n] == label]
+        for seed in pieces[:-1]:
+            if labels[seed] != label:
+                continue  # reached from an earlier piece, so still connected to it
+            self.floods += 1
+            self.sizes[label] -= self._flood(seed, label, self._new_label())
+        if not self.sizes[label]:
+            del self.sizes[label]
+
+    def _ring_connected(self, cord: int) -> bool:
+        """
+        True if the open 4-neighbours of cord still touch through its 8 surrounding
+        cells, so closing cord cannot split their region.
+        """
+        width, height = self.map.width, self.map.height
+        x, y = cord % width, cord // width
+        labels = self.labels
+        ring = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)]
+        open_ring = [0 <= x + dx < width and 0 <= y + dy < height and labels[cord + dx + dy * width] != 0
+                     for dx, dy in ring]
+        if all(open_ring):
+            return True
+        # Walk the ring from a closed cell; each run of open cells is connected along the ring
+        start = open_ring.index(False)
+        runs_with_side = 0
+        in_run = has_side = False
+        for step in range(1, 9):
+            index = (start + step) % 8
+            if open_ring[index]:
+                in_run = True
+                has_side = has_side or index % 2 == 0  # even entries are the 4-neighbours
+            elif in_run:
+                runs_with_side += has_side
+                in_run = has_side = False
+        return runs_with_side <= 1
+
+    def region_at(self, cord: int) -> int:
+        return self.labels[cord]
+
+    def connected(self, start: int, target: int) -> bool:
+        """
+        Whether a path from start to target can exist. A target on impassable
+        terrain counts as reached from any neighbour in start's region; a start
+        on impassable terrain (an actor standing in a doorway being closed) is
+        left for the search to decide.
+        """
+        region = self.labels[start]
+        if not region or self.labels[target] == region:
+            return True
+        if self.labels[target]:
+            return False
+        return any(self.labels[n] == region for n in neighbor_cords(target, self.map.width, self.map.height))
+
+    def cells(self, region: int) -> list:
+        return [cord for cord, label in enumerate(self.labels) if label == region]
+
+    def largest(self) -> int:
+        """Label of the biggest region, or 0 if the map has no passable terrain."""
+        return max(self.sizes, key=self.sizes.__getitem__, default=0)
 
 class PathFinder:
+    """
+    Grid search engine over a map's passability bitmap.
+    Parent pointers and costs live in flat arrays indexed by cell cord and are
+    reused between searches; a per-search stamp marks which entries are valid.
+    """
+    _engines = {}
+
+    def __init__(self, width: int, height: int):
+        size = width * height
+        self.width = width
+        self.height = height
+        self.parent = array('i', [-1]) * size
+        self.cost = array('i', [0]) * size
+        self.stamp = array('I', [0]) * size
+        self.search_id = 0
+
+    @classmethod
+    def for_map(cls, map_obj):
+        """Returns the shared engine for maps of this size."""
+        key = (map_obj.width, map_obj.height)
+        engine = cls._engines.get(key)
+        if engine is None:
+            engine = cls._engines[key] = cls(map_obj.width, map_obj.height)
+        return engine
+
     @staticmethod
-    def get_path_bfs(map_obj, start_x, start_y, target_x, target_y, max_dist=20):
+    def get_path_bfs(map_obj, start_x, start_y, target_x, target_y, max_dist=20, ignore_entities=False):
         """
         Calculates the shortest path using Breadth-First Search (BFS).
         Returns a list of tuples: [(x, y), (x, y)...]
+        With ignore_entities the search only treats terrain as blocking.
+        """
+        return PathFinder.for_map(map_obj).find_path(
+            map_obj, start_x, start_y, target_x, target_y, max_dist, ignore_entities, mode="bfs"
+        )
+
+    def _next_search(self) -> int:
+        self.search_id += 1
+        if self.search_id > 0xFFFFFFFF:
+            self.stamp = array('I', [0]) * (self.width * self.height)
+            self.search_id = 1
+        return self.search_id
+
+    def find_path(self, map_obj, start_x, start_y, target_x, target_y, max_dist=20, ignore_entities=False, mode="astar"):
+        """
+        Shortest 4-directional path of at most max_dist steps, excluding the start and
+        including the target, which may itself be impassable (an entity to reach).
+        mode "astar" uses a Manhattan heuristic; "bfs" reproduces get_path_bfs exactly.
         """
         if not map_obj.check_cords(target_x, target_y):
             return []
+        width = self.width
+        start = start_x + start_y * width
+        target = target_x + target_y * width
+        if start == target:
+            return [(target_x, target_y)]
+        regions = map_obj.region_labels()
+        if regions is not None and not regions.connected(start, target):
+            return []  # walled off: nothing to gain from flooding max_dist
 
-        queue = deque([(start_x, start_y, [])])
-        
-        visited = set()
-        visited.add((start_x, start_y))
+        passable = map_obj.terrain_passability if ignore_entities else map_obj.passability
+        search_id = self._next_search()
+        self.stamp[start] = search_id
+        self.cost[start] = 0
+        self.parent[start] = -1
 
-        directions = [
-            (0, 1),  # Down
-            (0, -1), # Up
-            (1, 0),  # Right
-            (-1, 0)  # Left
-        ]
+        if mode == "bfs":
+            found = self._bfs(passable, start, target, max_dist, search_id)
+        else:
+            found = self._astar(passable, start, target, target_x, target_y, max_dist, search_id)
+        if not found:
+            return []
 
+        path = []
+        cord = target
+        parent = self.parent
+        while cord != start:
+            path.append((cord % width, cord // width))
+            cord = parent[cord]
+        path.reverse()
+        return path
+
+    def _bfs(self, passable, start, target, max_dist, search_id) -> bool:
+        stamp, cost, parent = self.stamp, self.cost, self.parent
+        width = self.width
+        queue = deque([start])
         while queue:
-            cx, cy, path = queue.popleft()
+            cord = queue.popleft()
+            if cord == target:
+                return True
+            depth = cost[cord]
+            if depth >= max_dist:
+                continue
+            for n in neighbor_cords(cord, width, self.height):
+                if stamp[n] != search_id and (passable[n] or n == target):
+                    stamp[n] = search_id
+                    cost[n] = depth + 1
+                    parent[n] = cord
+                    queue.append(n)
+        return False
+
+    def _astar(self, passable, start, target, target_x, target_y, max_dist, search_id) -> bool:
+        stamp, cost, parent = self.stamp, self.cost, self.parent
+        width = self.width
+        h = abs(start % width - target_x) + abs(start // width - target_y)
+        if h > max_dist:
+            return False
+        heap = [(h, h, 0, start)]
+        while heap:
+            _, _, g, cord = heapq.heappop(heap)
+            if g > cost[cord]:
+                continue  # stale entry
+            if cord == target:
+                return True
+            if g >= max_dist:
+                continue
+            ng = g + 1
+            for n in neighbor_cords(cord, width, self.height):
+                if not passable[n] and n != target:
+                    continue
+                if stamp[n] == search_id and cost[n] <= ng:
+                    continue
+                nh = abs(n % width - target_x) + abs(n // width - target_y)
+                if ng + nh > max_dist:
+                    continue
+                stamp[n] = search_id
+                cost[n] = ng
+                parent[n] = cord
+                heapq.heappush(heap, (ng + nh, nh, ng, n))
+        return False
+
+@profiled("seek_path")
+def seek_path(entity, target_x, target_y, mode="astar"):
+    return PathFinder.for_map(entity.map).find_path(
+        entity.map,
+        entity.x,
+        entity.y,
+        target_x,
+        target_y,
+        entity.vision,
+        mode=mode
+    )
+
+class FlowField:
+    """
+    Breadth-first distance field from one target cell over terrain passability.
+    Shared by every NPC chasing that target: it is rebuilt once when the target
+    moves or the terrain changes, and each chaser then steps downhill in O(1).
+    """
+    UNREACHED = 0xFFFF
 
-            if (cx, cy) == (target_x, target_y):
-                return path + [(cx, cy)]
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.dist = array('H', [self.UNREACHED]) * (width * height)
+        self.source = -1
+        self.max_dist = 0
+        self.terrain_version = -1
+        self._touched = []
 
-            if len(path) >= max_dist:
+    @profiled("FlowField.update")
+    def update(self, map_obj, target_x: int, target_y: int, max_dist: int):
+        source = target_x + target_y * self.width
+        if (source, max_dist, map_obj.terrain_version) == (self.source, self.max_dist, self.terrain_version):
+            return
+        self.source, self.max_dist, self.terrain_version = source, max_dist, map_obj.terrain_version
+
+        dist = self.dist
+        for cord in self._touched:
+            dist[cord] = self.UNREACHED
+        touched = self._touched = [source]
+        dist[source] = 0
+
+        passable = map_obj.terrain_passability
+        width, height = self.width, self.height
+        queue = deque([source])
+        while queue:
+            cord = queue.popleft()
+            d = dist[cord] + 1
+            if d > max_dist:
                 continue
+            for n in neighbor_cords(cord, width, height):
+                if dist[n] == self.UNREACHED and passable[n]:
+                    dist[n] = d
+                    touched.append(n)
+                    queue.append(n)
+
+    @profiled("FlowField.next_step")
+    def next_step(self, entity):
+        """Neighbour one step closer to the target, or None if out of range or blocked."""
+        width = self.width
+        cord = entity.x + entity.y * width
+        d = self.dist[cord]
+        if d == self.UNREACHED or d == 0 or d > entity.vision:
+            return None
+        passable = entity.map.passability
+        for n in neighbor_cords(cord, width, self.height):
+            if self.dist[n] == d - 1 and passable[n]:
+                return (n % width, n // width)
+        return None
+
+class IncrementalPlanner:
+    """
+    D* Lite planner for one chasing entity. The search is rooted at the target
+    and keeps its g/rhs values between calls, so when the entity steps, the
+    target moves a tile, or a door, wall or actor changes passability, only the
+    affected part of the search is repaired instead of planning from scratch.
+    """
+    INF = float('inf')
+
+    def __init__(self, map_obj):
+        self.map = map_obj
+        self.reset()
+
+    def reset(self):
+        self.g = {}
+        self.rhs = {}
+        self.open = {}  # cord -> key currently queued
+        self.heap = []
+        self.km = 0
+        self.start = -1
+        self.goal = -1
+        self.log_version = self.map.passability_log.version
+
+    def _h(self, a: int, b: int) -> int:
+        width = self.map.width
+        return abs(a % width - b % width) + abs(a // width - b // width)
+
+    def _key(self, cord: int):
+        m = min(self.g.get(cord, self.INF), self.rhs.get(cord, self.INF))
+        return (m + self._h(self.start, cord) + self.km, m)
+
+    def _push(self, cord: int):
+        key = self._key(cord)
+        self.open[cord] = key
+        heapq.heappush(self.heap, (key, cord))
+
+    def _top(self):
+        heap = self.heap
+        while heap and self.open.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)  # superseded entry
+        return heap[0] if heap else None
+
+    def _traversable(self, cord: int) -> bool:
+        return cord == self.goal or self.map.passability[cord] == 1
+
+    def _update_vertex(self, cord: int):
+        width, height = self.map.width, self.map.height
+        if cord != self.goal:
+            best = self.INF
+            g = self.g
+            for n in neighbor_cords(cord, width, height):
+                if self._traversable(n):
+                    cost = g.get(n, self.INF) + 1
+                    if cost < best: best = cost
+            self.rhs[cord] = best
+        self.open.pop(cord, None)
+        if self.g.get(cord, self.INF) != self.rhs.get(cord, self.INF):
+            self._push(cord)
+
+    def _compute(self, max_dist: int):
+        width, height = self.map.width, self.map.height
+        g, rhs, start = self.g, self.rhs, self.start
+        while True:
+            top = self._top()
+            if top is None:
+                return
+            k_old, u = top
+            if not (k_old < self._key(start) or rhs.get(start, self.INF) != g.get(start, self.INF)):
+                return
+            if k_old[0] - self.km > max_dist:
+                return  # nothing left within range; leave the queue for later repairs
+            k_new = self._key(u)
+            if k_old < k_new:
+                self._push(u)
+            elif g.get(u, self.INF) > rhs.get(u, self.INF):
+                g[u] = rhs[u]
+                del self.open[u]
+                for n in neighbor_cords(u, width, height):
+                    self._update_vertex(n)
+            else:
+                g[u] = self.INF
+                self._update_vertex(u)
+                for n in neighbor_cords(u, width, height):
+                    self._update_vertex(n)
+
+    def _cell_changed(self, cord: int):
+        # Entering cord now costs something different, so its neighbours' rhs may change
+        for n in neighbor_cords(cord, self.map.width, self.map.height):
+            self._update_vertex(n)
+
+    def _sync(self, start: int, goal: int):
+        log = self.map.passability_log
+        changed = log.since(self.log_version)
+        if changed is None or self.goal < 0 or self._h(self.goal, goal) > 1:
+            self.reset()
+            self.start, self.goal = start, goal
+            self.rhs[goal] = 0
+            self._push(goal)
+            return
+        self.log_version = log.version
+
+        if start != self.start:
+            self.km += self._h(self.start, start)
+            self.start = start
+        if goal != self.goal:
+            old_goal, self.goal = self.goal, goal
+            self.rhs[goal] = 0
+            for cord in (old_goal, goal):
+                self._update_vertex(cord)
+                self._cell_changed(cord)
+        for cord in set(changed):
+            self._cell_changed(cord)
+
+    @profiled("IncrementalPlanner.next_step")
+    def next_step(self, entity, target):
+        """Next cell towards target within entity.vision, or None if there is no such path."""
+        if entity.map is not self.map:
+            self.map = entity.map
+            self.reset()
+        width = self.map.width
+        start = entity.x + entity.y * width
+        goal = target.x + target.y * width
+        if start == goal:
+            return None
+        regions = self.map.region_labels()
+        if regions is not None and not regions.connected(start, goal):
+            return None
+        self._sync(start, goal)
+        self._compute(entity.vision)
 
-            for dx, dy in directions:
-                nx, ny = cx + dx, cy + dy
-
-                if (nx, ny) not in visited:
-                    is_target = (nx, ny) == (target_x, target_y)
-                    
-                    if map_obj.check_cords(nx, ny):
-                        if map_obj.is_passable(nx, ny) or is_target:
-                            visited.add((nx, ny))
-                            new_path = path + [(nx, ny)]
-                            queue.append((nx, ny, new_path))
-        
-        return []
-
-def seek_path(entity, target_x, target_y):
-    return PathFinder.get_path_bfs(
-        entity.map, 
-        entity.x, 
-        entity.y, 
-        target_x, 
-        target_y, 
-        entity.vision
-    )
\ No newline at end of file
+        if self.g.get(start, self.INF) > entity.vision:
+            return None
+        best, best_cost = None, self.INF
+        for n in neighbor_cords(start, width, self.map.height):
+            if self._traversable(n):
+                cost = self.g.get(n, self.INF) + 1
+                if cost < best_cost:
+                    best, best_cost = n, cost
+        if best is None or not self.map.passability[best]:
+            return None
+        return (best % width, best // width)
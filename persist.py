@@ -0,0 +1,271 @@
+"""
+Compact binary encoding of maps, entities and items.
+
+Game objects are first reduced to plain states (None, bools, ints, floats,
+strings, bytes, lists, tuples and dicts) and then packed with a small tagged
+format. Tile data is stored as one bytes string per map with its own palette
+of block class names, so the result does not depend on the id order of this
+process' TERRAIN palette.
+"""
+import struct
+import zlib
+from world import Map, Location, Plain, Wall, Door, Tree, ForestBlock, ForestDirt, Village, Chest, ItemsPile, TERRAIN
+from items import item_template, Item, Potion, Equipment, Helmet, BreastPlate, Leggings, Sword, Coins
+from entities import LivingEntity, NPC, Goblin, Ghost, Human
+
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_LEN = struct.Struct("<I")
+
+def pack(value) -> bytes:
+    out = bytearray()
+    _pack(value, out)
+    return bytes(out)
+
+def _pack(value, out: bytearray):
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, int):
+        out += b"i"
+        out += _INT.pack(value)
+    elif isinstance(value, float):
+        out += b"d"
+        out += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        out += b"s"
+        out += _LEN.pack(len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        out += b"b"
+        out += _LEN.pack(len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out += b"l" if isinstance(value, list) else b"t"
+        out += _LEN.pack(len(value))
+        for entry in value:
+            _pack(entry, out)
+    elif isinstance(value, dict):
+        out += b"m"
+        out += _LEN.pack(len(value))
+        for key, entry in value.items():
+            _pack(key, out)
+            _pack(entry, out)
+    else:
+        raise TypeError(f"Cannot pack {type(value).__name__}")
+
+def unpack(data: bytes):
+    value, pos = _unpack(memoryview(data), 0)
+    if pos != len(data):
+        raise ValueError("Trailing data after packed value")
+    return value
+
+def _unpack(data: memoryview, pos: int):
+    tag = data[pos:pos + 1].tobytes()
+    pos += 1
+    if tag == b"N": return None, pos
+    if tag == b"T": return True, pos
+    if tag == b"F": return False, pos
+    if tag == b"i": return _INT.unpack_from(data, pos)[0], pos + _INT.size
+    if tag == b"d": return _FLOAT.unpack_from(data, pos)[0], pos + _FLOAT.size
+
+    length = _LEN.unpack_from(data, pos)[0]
+    pos += _LEN.size
+    if tag == b"s": return str(data[pos:pos + length], "utf-8"), pos + length
+    if tag == b"b": return data[pos:pos + length].tobytes(), pos + length
+    if tag in (b"l", b"t"):
+        values = []
+        for _ in range(length):
+            value, pos = _unpack(data, pos)
+            values.append(value)
+        return (values if tag == b"l" else tuple(values)), pos
+    if tag == b"m":
+        mapping = {}
+        for _ in range(length):
+            key, pos = _unpack(data, pos)
+            mapping[key], pos = _unpack(data, pos)
+        return mapping, pos
+    raise ValueError(f"Unknown tag {tag!r} at offset {pos - 1}")
+
+# --- Items ---
+
+ITEM_CLASSES = {cls.__name__: cls for cls in (Item, Potion, Equipment, Helmet, BreastPlate, Leggings, Sword, Coins)}
+
+def item_state(item) -> tuple:
+    """The item's template fields followed by its own state; price is the template's, per unit."""
+    template = item.template
+    return (type(item).__name__, template.name, template.damage, template.protection, template.price,
+            template.symbol, item.equipped, item.count)
+
+def make_item(state):
+    cls_name, name, damage, protection, price, symbol, equipped, count = state
+    cls = ITEM_CLASSES[cls_name]
+    return cls.from_template(item_template(cls, name, damage, protection, price, symbol), equipped, count)
+
+# --- Entities ---
+
+ENTITY_CLASSES = {cls.__name__: cls for cls in (Goblin, Ghost, Human)}
+ENTITY_FIELDS = ('x', 'y', 'symbol', 'health', 'strength', 'alive', 'color', 'in_fight',
+                 'last_hit_time', 'hit_cooldown', 'priority', 'passable')
+NPC_FIELDS = ('attitude', 'vision', 'movement_cooldown', 'last_moved', 'change_direction_time',
+              'last_direction_change')
+PLAYER_FIELDS = ('vision', 'base_strength', 'base_defense')
+# Game-clock timestamps; saved relative to the clock at save time so they stay
+# meaningful after a restart resets the clock.
+TIME_FIELDS = frozenset(('last_hit_time', 'last_moved', 'last_direction_change'))
+
+def _entity_fields(entity) -> tuple:
+    if isinstance(entity, NPC):
+        return ENTITY_FIELDS + NPC_FIELDS
+    if getattr(entity, 'is_player', False):
+        return ENTITY_FIELDS + PLAYER_FIELDS
+    return ENTITY_FIELDS
+
+def _gear_state(entity, gear) -> list:
+    """Equipped items as indexes into entity.items, or full states for gear not in the bag."""
+    indexes = {id(item): index for index, item in enumerate(entity.items)}
+    return [indexes[id(item)] if id(item) in indexes else item_state(item) for item in gear]
+
+def _make_gear(items, states) -> list:
+    return [items[state] if isinstance(state, int) else make_item(state) for state in states]
+
+def entity_state(entity, refs: dict, now: int = 0) -> dict:
+    """refs maps entities that may be targeted to the reference stored in their place."""
+    return {
+        "class": type(entity).__name__,
+        "fields": [getattr(entity, name) - now if name in TIME_FIELDS else getattr(entity, name)
+                   for name in _entity_fields(entity)],
+        "items": [item_state(item) for item in entity.items],
+        "weapon": _gear_state(entity, entity.weapon),
+        "armor": _gear_state(entity, entity.armor),
+        "target": refs.get(entity.target),
+    }
+
+def apply_entity_state(entity, state, now: int = 0):
+    """Overwrites entity's saved fields and gear in place; the target is left to the caller."""
+    for name, value in zip(_entity_fields(entity), state["fields"]):
+        setattr(entity, name, value + now if name in TIME_FIELDS else value)
+    # In place: the player's Inventory keeps its listeners across a load
+    entity.items.clear()
+    entity.items.extend(make_item(item) for item in state["items"])
+    entity.equipment[:] = [None] * len(entity.equipment)
+    for item in _make_gear(entity.items, state["weapon"]) + _make_gear(entity.items, state["armor"]):
+        entity.equip(item)
+    entity.refresh_equipment()
+
+def make_entity(state, map_obj, now: int = 0):
+    """Rebuilds an NPC without running its class __init__, which would roll new gear."""
+    cls = ENTITY_CLASSES[state["class"]]
+    entity = cls.__new__(cls)
+    NPC.__init__(entity, 0, 0, '', 'passive', map_obj, 0, 0, 0, [], [])
+    apply_entity_state(entity, state, now)
+    return entity
+
+# --- Maps ---
+
+TERRAIN_CLASSES = {cls.__name__: cls for cls in (Plain, Wall, Door, Tree, ForestBlock, ForestDirt)}
+
+def _shared_block(cls):
+    block = TERRAIN.blocks.get(cls)
+    if block is None:
+        block = TERRAIN.blocks[cls] = cls(0) if cls in (Tree, ForestBlock) else cls()
+    return block
+
+def palette_state(palette_ids) -> list:
+    """Block class names of each palette id, bottom to top."""
+    return [tuple(type(block).__name__ for block in TERRAIN.stacks[palette_id]) for palette_id in palette_ids]
+
+def palette_table(names) -> bytes:
+    """bytes.translate table from the local ids of a saved palette to this process' palette ids."""
+    table = bytearray(256)
+    for local_id, stack in enumerate(names):
+        table[local_id] = TERRAIN.intern([_shared_block(TERRAIN_CLASSES[name]) for name in stack])
+    return bytes(table)
+
+def terrain_state(map_obj) -> dict:
+    """Terrain as bytes plus the block class names each local palette id stands for."""
+    used = sorted(set(map_obj.terrain))
+    table = bytearray(256)
+    for local_id, palette_id in enumerate(used):
+        table[palette_id] = local_id
+    return {"palette": palette_state(used), "cells": bytes(map_obj.terrain).translate(bytes(table))}
+
+def restore_terrain(map_obj, state):
+    map_obj.terrain[:] = state["cells"].translate(palette_table(state["palette"]))
+    map_obj.terrain_rewritten()
+
+def object_state(obj, cord: int, locations: dict = None):
+    """locations maps Location markers on the world map to their index in the save."""
+    if isinstance(obj, (Chest, ItemsPile)):
+        return (type(obj).__name__, cord, [item_state(item) for item in obj.items])
+    if isinstance(obj, Village):
+        return ("Village", cord, obj.houses)
+    if isinstance(obj, Location) and locations is not None:
+        return ("Location", cord, locations[obj])
+    raise TypeError(f"Cannot save map object {type(obj).__name__}")
+
+def make_object(state, locations: list = None):
+    cls_name, cord, data = state
+    if cls_name == "Village":
+        return Village(cord, data)
+    if cls_name == "Location":
+        return locations[data]
+    container = {"Chest": Chest, "ItemsPile": ItemsPile}[cls_name](cord)
+    container.items = [make_item(item) for item in data]
+    return container
+
+def contents_state(map_obj, refs: dict = None, now: int = 0, exclude=(), locations: dict = None) -> dict:
+    """
+    Objects and entities of a map, skipping the entities in exclude. Entity
+    targets are saved as their index in the saved entity list, or as
+    refs[target] for entities that live elsewhere (the player).
+    """
+    entities = [entity for entity in map_obj.entities if entity not in exclude]
+    refs = dict(refs or {})
+    refs.update((entity, index) for index, entity in enumerate(entities))
+    objects = []
+    for cord, stack in map_obj.objects.items():
+        for obj in stack:
+            if not isinstance(obj, LivingEntity):
+                objects.append(object_state(obj, cord, locations))
+    return {
+        "objects": objects,
+        "entities": [entity_state(entity, refs, now) for entity in entities],
+    }
+
+def restore_contents(map_obj, state, refs: dict = None, now: int = 0, locations: list = None) -> list:
+    """Adds saved objects and entities to map_obj; refs maps saved references back to outside entities."""
+    for obj_state in state["objects"]:
+        cord = obj_state[1]
+        map_obj.add_object(make_object(obj_state, locations), x=cord % map_obj.width, y=cord // map_obj.width)
+
+    entities = [make_entity(entity, map_obj, now) for entity in state["entities"]]
+    for entity in entities:
+        map_obj.add_entity(entity, entity.x, entity.y)
+    refs = refs or {}
+    for entity, entity_state in zip(entities, state["entities"]):
+        target = entity_state["target"]
+        entity.target = entities[target] if isinstance(target, int) else refs.get(target)
+    return entities
+
+def map_state(map_obj, refs: dict = None, now: int = 0, exclude=(), locations: dict = None) -> dict:
+    """Terrain, objects and entities of a flat (not chunked) map."""
+    state = contents_state(map_obj, refs, now, exclude, locations)
+    state.update(width=map_obj.width, height=map_obj.height, terrain=terrain_state(map_obj))
+    return state
+
+def restore_map(map_obj, state, refs: dict = None, now: int = 0, locations: list = None) -> list:
+    """Resets map_obj and fills it from map_state; returns the restored entities in saved order."""
+    Map.__init__(map_obj, state["width"], state["height"])
+    restore_terrain(map_obj, state["terrain"])
+    return restore_contents(map_obj, state, refs, now, locations)
+
+def dumps(state) -> bytes:
+    return zlib.compress(pack(state))
+
+def loads(data: bytes):
+    return unpack(zlib.decompress(data))
@@ -1,14 +1,18 @@
 import pygame
 from entities import LivingEntity
-from items import Sword, Helmet, BreastPlate, Leggings, Potion, Coins
+from items import Potion, WEAPON
+from inventory import Inventory
 
 class Player(LivingEntity):
+    __slots__ = ('is_player', 'vision', 'base_strength', 'base_defense', 'hotbar')
+
     def __init__(self, x, y, map_obj):
         super().__init__(x, y, '@', map_obj, 30, 5)
         
         self.is_player = True 
         self.vision = 20
         self.hit_cooldown = 200 
+        self.items = Inventory()
         
         self.base_strength = 5
         self.base_defense = 0 
@@ -16,12 +20,8 @@ class Player(LivingEntity):
         self.hotbar = [None] * 5 
 
     def add_item(self, new_item):
-        if isinstance(new_item, Coins):
-            for item in self.items:
-                if isinstance(item, Coins):
-                    item.price += new_item.price
-                    return 
-        self.items.append(new_item)
+        # Coins and potions join the stack already in the bag
+        return self.items.add(new_item)
 
     def trigger_hotbar(self, slot_index):
         if 0 <= slot_index < 5:
@@ -36,28 +36,19 @@ class Player(LivingEntity):
                 print("Hotbar slot cleared (item missing)")
 
     def equip_item(self, item):
-        if isinstance(item, Sword):
-            for w in self.weapon:
-                w.equipped = False
-            self.weapon = [item]
-            item.equipped = True
-            print(f"Equipped {item.name}")
-
-        elif isinstance(item, (Helmet, BreastPlate, Leggings)):
-            for a in self.armor[:]:
-                if type(a) == type(item):
-                    a.equipped = False
-                    self.armor.remove(a)
-            
-            self.armor.append(item)
+        if item.SLOT is not None:
+            # The slot table swaps out whatever was worn there
+            previous = self.equip(item)
+            if previous is not None:
+                previous.equipped = False
             item.equipped = True
             print(f"Equipped {item.name}")
         
         elif isinstance(item, Potion):
             self.health = min(30, self.health + 10) 
-            self.items.remove(item)
-            # Potions are consumed, so remove from hotbar if present
-            if item in self.hotbar:
+            self.items.take(item)
+            # Potions are consumed, so remove the emptied stack from the hotbar
+            if item not in self.items and item in self.hotbar:
                 idx = self.hotbar.index(item)
                 self.hotbar[idx] = None
             print("Used Potion")
@@ -65,10 +56,11 @@ class Player(LivingEntity):
         self.recalculate_stats()
 
     def recalculate_stats(self):
+        weapon = self.equipment[WEAPON]
         self.strength = self.base_strength
-        for w in self.weapon:
-            if w.equipped:
-                self.strength += w.damage
+        if weapon is not None and weapon.equipped:
+            self.strength += weapon.damage
+        self.refresh_equipment()
 
     def get_out_of_fight(self):
         if self.fight:
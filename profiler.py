@@ -0,0 +1,140 @@
+"""
+Per-frame phase profiler.
+
+Game.step brackets every frame with begin_frame()/end_frame() and each of
+its phases with PROFILER.phase(name); hot calls are wrapped with
+@profiled(name). While the profiler is off those cost one attribute check.
+While it is on, every span is kept in a ring buffer of the last
+PROFILE_EVENTS spans for export as Chrome trace-event JSON (load it in
+chrome://tracing or Perfetto), and the frame time and each phase's total
+per frame are kept in rings of the last PROFILE_FRAMES frames, from which
+the overlay reads its p50/p95/p99.
+"""
+import json
+from array import array
+from functools import wraps
+from time import perf_counter_ns
+from settings import PROFILE_FRAMES, PROFILE_EVENTS
+
+FRAME = "frame"
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'started')
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.started, perf_counter_ns())
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NO_SPAN = _NoSpan()
+
+class Profiler:
+    def __init__(self, frames: int = PROFILE_FRAMES, events: int = PROFILE_EVENTS):
+        self.enabled = False
+        self.max_frames = frames
+        self.max_events = events
+        self.reset()
+
+    def reset(self):
+        self.origin = perf_counter_ns()  # trace timestamps count from here
+        self.frames = 0                  # frames recorded; the rings hold the last max_frames
+        self.frame_ms = {}               # phase name (FRAME for the whole frame) -> ring of ms per frame
+        self.this_frame = {}             # phase name -> ns spent in it during the current frame
+        self.events = [None] * self.max_events  # (name, start ns, duration ns), ring
+        self.event_count = 0
+        self.frame_started = None
+
+    def enable(self, on: bool = True):
+        if on and not self.enabled:
+            self.reset()
+        self.enabled = on
+
+    def phase(self, name: str):
+        """Context manager timing one phase; a shared no-op while disabled."""
+        return _Span(self, name) if self.enabled else NO_SPAN
+
+    def record(self, name: str, started: int, ended: int):
+        duration = ended - started
+        self.events[self.event_count % self.max_events] = (name, started, duration)
+        self.event_count += 1
+        self.this_frame[name] = self.this_frame.get(name, 0) + duration
+
+    def begin_frame(self):
+        self.frame_started = perf_counter_ns() if self.enabled else None
+
+    def end_frame(self):
+        if self.frame_started is None or not self.enabled:
+            return
+        self.record(FRAME, self.frame_started, perf_counter_ns())
+        slot = self.frames % self.max_frames
+        for name in self.this_frame.keys() - self.frame_ms.keys():
+            self.frame_ms[name] = array('d', bytes(8 * self.max_frames))
+        for name, ring in self.frame_ms.items():
+            ring[slot] = self.this_frame.get(name, 0) / 1e6
+        self.this_frame.clear()
+        self.frames += 1
+
+    def percentiles(self, name: str = FRAME, points=(50, 95, 99)) -> tuple:
+        """Milliseconds per frame spent in name at each percentile of the recorded frames."""
+        ring = self.frame_ms.get(name)
+        count = min(self.frames, self.max_frames)
+        if ring is None or count == 0:
+            return tuple(0.0 for _ in points)
+        ordered = sorted(ring[:count])
+        return tuple(ordered[min(count - 1, count * point // 100)] for point in points)
+
+    def phases(self) -> list:
+        """Recorded phase names, busiest (by p95) first; the frame itself excluded."""
+        return sorted((name for name in self.frame_ms if name != FRAME),
+                      key=lambda name: self.percentiles(name, (95,))[0], reverse=True)
+
+    def trace(self) -> dict:
+        """The buffered spans as Chrome trace-event JSON ("X" complete events, microseconds)."""
+        count = min(self.event_count, self.max_events)
+        first = self.event_count - count
+        events = []
+        for index in range(first, self.event_count):
+            name, started, duration = self.events[index % self.max_events]
+            events.append({"name": name, "cat": "frame" if name == FRAME else "phase", "ph": "X",
+                           "ts": (started - self.origin) / 1000, "dur": duration / 1000, "pid": 1, "tid": 1})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str) -> int:
+        """Writes trace() to path; returns the number of events written."""
+        trace = self.trace()
+        with open(path, "w") as f:
+            json.dump(trace, f)
+        return len(trace["traceEvents"])
+
+PROFILER = Profiler()
+
+def profiled(name: str):
+    """Decorator timing every call of a hot function as a span called name while PROFILER is enabled."""
+    def wrap(func):
+        @wraps(func)
+        def timed(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            started = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(name, started, perf_counter_ns())
+        return timed
+    return wrap
@@ -0,0 +1,156 @@
+import weakref
+from collections import OrderedDict
+import pygame
+from settings import TILE_SIZE, COLORS
+from world import Location, TERRAIN
+
+PAGE_TILES = 32
+PAGE_MARGIN = 1  # ring of spare pages kept around the view, so walking back and forth does not re-render
+VIEW_OFFSET = 10
+
+class WorldRenderer:
+    """
+    Draws the map view from cached terrain pages plus a per-frame overlay of
+    entities and containers. Terrain pages are pre-rendered once per map and
+    patched from the map's terrain_log, and after the first full frame only
+    tiles whose overlay or terrain changed are redrawn and reported as dirty.
+    """
+    def __init__(self, symbol_renderer):
+        self.symbols = symbol_renderer
+        self.pages = weakref.WeakKeyDictionary()  # map -> {(page_x, page_y): Surface}
+        self.page_versions = weakref.WeakKeyDictionary()  # map -> terrain_log version pages reflect
+        self.last_view = None
+        self.last_overlay = {}
+        self.valid = False
+        self.max_pages = 0  # pages kept per map, set from the view size; large (chunked) maps drop the least recently drawn
+
+    def invalidate(self):
+        """Forces the next frame to be redrawn in full (something else drew over the map)."""
+        self.valid = False
+
+    def forget(self, map_obj):
+        """Drops the cached pages of a map that will not be drawn for a while."""
+        self.pages.pop(map_obj, None)
+        self.page_versions.pop(map_obj, None)
+
+    def _terrain_glyph(self, map_obj, cord: int):
+        top = TERRAIN.stacks[map_obj.terrain_id(cord)][-1]
+        return self.symbols.get_surface(str(top), getattr(top, 'color', COLORS["WHITE"]))
+
+    def _get_page(self, map_obj, page_x: int, page_y: int):
+        pages = self.pages.get(map_obj)
+        if pages is None:
+            pages = self.pages[map_obj] = OrderedDict()
+        page = pages.get((page_x, page_y))
+        if page is not None:
+            pages.move_to_end((page_x, page_y))
+        else:
+            page = pygame.Surface((PAGE_TILES * TILE_SIZE, PAGE_TILES * TILE_SIZE))
+            page.fill(COLORS["BLACK"])
+            for y in range(page_y * PAGE_TILES, min((page_y + 1) * PAGE_TILES, map_obj.height)):
+                for x in range(page_x * PAGE_TILES, min((page_x + 1) * PAGE_TILES, map_obj.width)):
+                    glyph = self._terrain_glyph(map_obj, x + y * map_obj.width)
+                    page.blit(glyph, ((x % PAGE_TILES) * TILE_SIZE, (y % PAGE_TILES) * TILE_SIZE))
+            pages[(page_x, page_y)] = page
+            if len(pages) > self.max_pages:
+                pages.popitem(last=False)
+        return page
+
+    def _sync_terrain(self, map_obj):
+        """Re-renders changed terrain tiles; returns their cords, or None if the pages were dropped."""
+        log = map_obj.terrain_log
+        if map_obj not in self.page_versions:
+            self.page_versions[map_obj] = log.version
+            return None
+        changed = log.since(self.page_versions[map_obj])
+        self.page_versions[map_obj] = log.version
+        if changed is None:
+            self.pages.pop(map_obj, None)
+            return None
+        pages = self.pages.get(map_obj, {})
+        for cord in changed:
+            x, y = cord % map_obj.width, cord // map_obj.width
+            page = pages.get((x // PAGE_TILES, y // PAGE_TILES))
+            if page is not None:
+                tile = ((x % PAGE_TILES) * TILE_SIZE, (y % PAGE_TILES) * TILE_SIZE)
+                page.fill(COLORS["BLACK"], (tile, (TILE_SIZE, TILE_SIZE)))
+                page.blit(self._terrain_glyph(map_obj, cord), tile)
+        return changed
+
+    def _overlay(self, map_obj, x0, y0, x1, y1, target):
+        """Visible cells whose top object is not terrain: (x, y) -> (symbol, color, highlighted)."""
+        overlay = {}
+        width = map_obj.width
+        if len(map_obj.objects) < (x1 - x0) * (y1 - y0):
+            cords = [c for c in map_obj.objects if x0 <= c % width < x1 and y0 <= c // width < y1]
+        else:
+            cords = [x + y * width for y in range(y0, y1) for x in range(x0, x1) if x + y * width in map_obj.objects]
+        for cord in cords:
+            stack = map_obj.get_stack(cord)
+            top_obj = stack[-1]
+            if isinstance(top_obj, Location):
+                if len(stack) > 1: top_obj = stack[-2]
+                else: continue
+            if getattr(top_obj, 'is_terrain', False):
+                continue
+
+            color = getattr(top_obj, 'color', COLORS["WHITE"])
+            if str(top_obj) == '@': color = COLORS["WHITE"]
+            elif str(top_obj) == 'G': color = COLORS["RED"]
+            overlay[(cord % width, cord // width)] = (str(top_obj), color, target is not None and top_obj == target)
+        return overlay
+
+    def _draw_cell(self, screen, map_obj, x, y, cam_x, cam_y, overlay_entry, from_pages: bool):
+        screen_x = (x - cam_x) * TILE_SIZE + VIEW_OFFSET
+        screen_y = (y - cam_y) * TILE_SIZE + VIEW_OFFSET
+        rect = pygame.Rect(screen_x, screen_y, TILE_SIZE, TILE_SIZE)
+        if overlay_entry is None:
+            if from_pages:
+                page = self._get_page(map_obj, x // PAGE_TILES, y // PAGE_TILES)
+                area = ((x % PAGE_TILES) * TILE_SIZE, (y % PAGE_TILES) * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+                screen.blit(page, rect, area)
+            return rect
+        symbol, color, highlighted = overlay_entry
+        screen.fill(COLORS["BLACK"], rect)
+        if highlighted:
+            pygame.draw.rect(screen, (50, 0, 0), rect)
+        screen.blit(self.symbols.get_surface(symbol, color), rect)
+        return rect
+
+    def draw(self, screen, map_obj, cam_x, cam_y, view_w, view_h, target=None):
+        """Draws the view; returns the dirty rects, or None when the whole screen changed."""
+        x0, y0 = cam_x, cam_y
+        x1, y1 = min(cam_x + view_w, map_obj.width), min(cam_y + view_h, map_obj.height)
+        view = (map_obj, cam_x, cam_y, view_w, view_h)
+        # A view not aligned to pages straddles one more page per axis than it fills
+        span_x, span_y = -(-view_w // PAGE_TILES) + 1, -(-view_h // PAGE_TILES) + 1
+        self.max_pages = (span_x + 2 * PAGE_MARGIN) * (span_y + 2 * PAGE_MARGIN)
+        changed_terrain = self._sync_terrain(map_obj)
+        overlay = self._overlay(map_obj, x0, y0, x1, y1, target)
+
+        if not self.valid or changed_terrain is None or view != self.last_view:
+            screen.fill(COLORS["BLACK"])
+            view_rect = pygame.Rect(VIEW_OFFSET, VIEW_OFFSET, (x1 - x0) * TILE_SIZE, (y1 - y0) * TILE_SIZE)
+            screen.set_clip(view_rect)
+            for page_y in range(y0 // PAGE_TILES, (y1 - 1) // PAGE_TILES + 1):
+                for page_x in range(x0 // PAGE_TILES, (x1 - 1) // PAGE_TILES + 1):
+                    dest = ((page_x * PAGE_TILES - cam_x) * TILE_SIZE + VIEW_OFFSET,
+                            (page_y * PAGE_TILES - cam_y) * TILE_SIZE + VIEW_OFFSET)
+                    screen.blit(self._get_page(map_obj, page_x, page_y), dest)
+            screen.set_clip(None)
+            for (x, y), entry in overlay.items():
+                self._draw_cell(screen, map_obj, x, y, cam_x, cam_y, entry, False)
+            dirty = None
+        else:
+            cells = {cell for cell in overlay if overlay[cell] != self.last_overlay.get(cell)}
+            cells.update(cell for cell in self.last_overlay if cell not in overlay)
+            for cord in changed_terrain:
+                x, y = cord % map_obj.width, cord // map_obj.width
+                if x0 <= x < x1 and y0 <= y < y1:
+                    cells.add((x, y))
+            dirty = [self._draw_cell(screen, map_obj, x, y, cam_x, cam_y, overlay.get((x, y)), True) for x, y in cells]
+
+        self.last_view = view
+        self.last_overlay = overlay
+        self.valid = True
+        return dirty
@@ -0,0 +1,220 @@
+"""
+Binary save games and background autosave.
+
+snapshot() copies the game into plain values on the main thread: tile data
+as bytes copies, objects and entities as small tuples and dicts. Nothing in
+a snapshot refers back to live game objects, so write_snapshot() can pack,
+compress and write it from another thread while the game keeps running.
+
+Locations are saved as separate blobs in the LocationStore format. Loading
+decodes only the world and the Location the player is in and hands the rest
+to the LocationStore as paged out, so load time does not grow with the
+number of Locations visited.
+"""
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import persist
+import timing
+from chunks import ChunkedWorldMap
+from combat import Fight, Hit, NoMessages
+from location_store import LocationStore
+from world import WorldMap, Location, TERRAIN
+from settings import COLORS, AUTOSAVE_PATH, AUTOSAVE_INTERVAL_MS, LOAD_BUDGET_MS
+
+MAGIC = b"RPGSAVE\x03"  # \x03: NPCs saved without the unused path fields
+
+def world_state(world, refs: dict, now: int, player, location_ids: dict) -> dict:
+    state = persist.contents_state(world, refs, now, exclude=(player,), locations=location_ids)
+    state.update(width=world.width, height=world.height)
+    if isinstance(world, ChunkedWorldMap):
+        # Unchanged chunks are regenerated from the seed; only edited ones are stored
+        chunks = [(key[0], key[1], data) for key, data in world.stash.items()]
+        chunks.extend((key[0], key[1], zlib.compress(bytes(chunk.terrain)))
+                      for key, chunk in world.chunks.items() if chunk.dirty)
+        state.update(
+            kind="chunked", seed=world.seed, chunk_size=world.chunk_size, budget=world.budget,
+            forest_density=world.forest_density, village_density=world.village_density,
+            populated=sorted(world.populated), chunks=chunks,
+            palette=persist.palette_state(range(len(TERRAIN.stacks))),
+        )
+    else:
+        state.update(kind="flat", terrain=persist.terrain_state(world))
+    return state
+
+def restore_world(state, refs: dict, now: int, locations: list):
+    """Returns the new world map and its entities in saved order."""
+    if state["kind"] == "chunked":
+        world = ChunkedWorldMap(state["width"], state["height"], state["seed"], state["chunk_size"], state["budget"])
+        world.generate(state["forest_density"], state["village_density"])
+        world.populated = set(state["populated"])
+        table = persist.palette_table(state["palette"])
+        world.stash = {(chunk_x, chunk_y): zlib.compress(zlib.decompress(data).translate(table))
+                       for chunk_x, chunk_y, data in state["chunks"]}
+    else:
+        world = WorldMap(state["width"], state["height"])
+        persist.restore_terrain(world, state["terrain"])
+    return world, persist.restore_contents(world, state, refs, now, locations)
+
+def snapshot(game) -> dict:
+    now = timing.get_ticks()
+    player = game.player
+    world = game.world_map
+    current = game.current_map
+    refs = {player: "player"}
+
+    locations = [obj for stack in world.objects.values() for obj in stack if isinstance(obj, Location)]
+    location_ids = {location: index for index, location in enumerate(locations)}
+    location_states = []
+    for location in locations:
+        data = game.locations.saved_data(location)
+        location_states.append(data if data is not None else persist.map_state(location, refs, now, exclude=(player,)))
+
+    # References into the current map use the same order the map is saved in
+    current_refs = dict(refs)
+    current_refs.update((entity, index) for index, entity in enumerate(e for e in current.entities if e is not player))
+    fights = []
+    for entity in [player] + current.entities:
+        if entity.fight is not None and entity.fight not in fights:
+            fights.append(entity.fight)
+    fight_ids = {fight: index for index, fight in enumerate(fights)}
+
+    return {
+        "now": now,
+        "world": world_state(world, refs, now, player, location_ids),
+        "locations": location_states,
+        "current": location_ids.get(current),
+        "player": {
+            "entity": persist.entity_state(player, current_refs, now),
+            "hotbar": [player.items.index(item) if item in player.items else None for item in player.hotbar],
+            "fight": fight_ids.get(player.fight),
+        },
+        "fights": [{
+            "party": [current_refs.get(member) for member in fight.party],
+            "directions": [fight.directions.get(member, 0) for member in fight.party],
+            "next_attack": fight.next_allowed_enemy_attack - now,
+        } for fight in fights],
+        "events": [{
+            "fight": fight_ids[hit.fight.current],
+            "attacker": current_refs.get(hit.attacker),
+            "defender": current_refs.get(hit.defender),
+            "delay": hit.delay,
+            "created": hit.created_time - now,
+        } for hit in current.events if isinstance(hit, Hit) and hit.fight.current in fight_ids],
+        "last_world_pos": game.last_world_pos,
+        "last_move": game.last_move - now,
+    }
+
+def write_snapshot(state, path: str):
+    """Packs, compresses and atomically writes a snapshot. Safe to call off the main thread."""
+    locations = [data if isinstance(data, bytes) else persist.dumps(data) for data in state["locations"]]
+    data = MAGIC + persist.dumps(dict(state, locations=locations))
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def save_game(game, path: str):
+    write_snapshot(snapshot(game), path)
+
+def load_game(game, path: str) -> tuple:
+    """
+    Replaces the game's world, Locations and player state with the save at
+    path; returns the load time and how far it ran over LOAD_BUDGET_MS (0 if
+    it did not), both in ms.
+    """
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a save file")
+    state = persist.loads(data[len(MAGIC):])
+    now = timing.get_ticks()
+    player = game.player
+    refs = {"player": player}
+
+    locations = [Location([], generate=False) for _ in state["locations"]]
+    world, entities = restore_world(state["world"], refs, now, locations)
+    game.locations.close()
+    game.locations = LocationStore()
+    current = world
+    for index, (location, blob) in enumerate(zip(locations, state["locations"])):
+        if index == state["current"]:
+            entities = persist.restore_map(location, persist.loads(blob), refs, now)
+            game.locations.enter(location)
+            current = location
+        else:
+            game.locations.adopt(location, blob)
+
+    def resolve(ref):
+        if ref == "player":
+            return player
+        return entities[ref] if isinstance(ref, int) else None
+
+    player_state = state["player"]
+    player.map = current
+    persist.apply_entity_state(player, player_state["entity"], now)
+    player.target = resolve(player_state["entity"]["target"])
+    player.hotbar = [player.items[index] if index is not None else None for index in player_state["hotbar"]]
+    current.add_entity(player, player.x, player.y)
+
+    fights = []
+    for fight_state in state["fights"]:
+        fight = Fight(current, game.ui if "player" in fight_state["party"] else NoMessages())
+        for ref, direction in zip(fight_state["party"], fight_state["directions"]):
+            member = resolve(ref)
+            if member is not None:
+                fight.party.append(member)
+                fight.directions[member] = direction
+                member.fight = fight
+        fight.next_allowed_enemy_attack = fight_state["next_attack"] + now
+        current.fights.add(fight)
+        fights.append(fight)
+    player.fight = fights[player_state["fight"]] if player_state["fight"] is not None else None
+    for hit_state in state["events"]:
+        attacker = resolve(hit_state["attacker"])
+        hit = Hit(fights[hit_state["fight"]], attacker, resolve(hit_state["defender"]),
+                  hit_state["delay"], hit_state["created"] + now, game.ui)
+        current.events.schedule(hit, hit.due_time, owner=attacker)
+
+    game.world_map = world
+    game.current_map = current
+    game.last_world_pos = tuple(state["last_world_pos"])
+    game.last_move = state["last_move"] + now
+
+    elapsed = (time.perf_counter() - started) * 1000
+    return elapsed, max(0.0, elapsed - LOAD_BUDGET_MS)
+
+class Autosaver:
+    """
+    Takes a snapshot every interval_ms on the main thread and writes it on a
+    worker thread. A save is skipped while the previous write is still running.
+    """
+    def __init__(self, game, path: str = AUTOSAVE_PATH, interval_ms: int = AUTOSAVE_INTERVAL_MS):
+        self.game = game
+        self.path = path
+        self.interval_ms = interval_ms
+        self.next_save = timing.get_ticks() + interval_ms
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+        self.pending = None
+        self.saves = 0
+        self.last_snapshot_ms = 0.0  # main-thread cost of the last autosave
+
+    def tick(self, now: int):
+        if self.pending is not None and self.pending.done():
+            if self.pending.exception() is not None:
+                self.game.ui.add_message("Autosave failed", COLORS["RED"])
+            else:
+                self.saves += 1
+            self.pending = None
+        if now < self.next_save or self.pending is not None:
+            return
+        self.next_save = now + self.interval_ms
+        started = time.perf_counter()
+        state = snapshot(self.game)
+        self.last_snapshot_ms = (time.perf_counter() - started) * 1000
+        self.pending = self.executor.submit(write_snapshot, state, self.path)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,148 @@
+import heapq
+from itertools import count
+
+_CANCELLED = object()
+
+class TimerQueue:
+    """
+    Min-heap of items keyed on the game time they are due. Each item is queued
+    at most once; scheduling it again moves it. Cancelled and moved entries
+    stay in the heap and are skipped when they reach the top.
+    """
+    def __init__(self):
+        self._heap = []         # [due, sequence, item]; sequence keeps equal due times in FIFO order
+        self._entries = {}      # item -> its live heap entry
+        self._sequence = count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item):
+        return item in self._entries
+
+    def __iter__(self):
+        """Queued items in no particular order."""
+        return iter(list(self._entries))
+
+    def schedule(self, item, due: int):
+        self.cancel(item)
+        entry = [due, next(self._sequence), item]
+        self._entries[item] = entry
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._compact()
+
+    def cancel(self, item) -> bool:
+        entry = self._entries.pop(item, None)
+        if entry is None:
+            return False
+        entry[2] = _CANCELLED
+        return True
+
+    def due_time(self, item):
+        entry = self._entries.get(item)
+        return entry[0] if entry else None
+
+    def next_due(self):
+        """Due time of the earliest live item, or None if the queue is empty."""
+        heap = self._heap
+        while heap and heap[0][2] is _CANCELLED:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now: int) -> list:
+        """Removes and returns every item due at or before now, earliest first."""
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, _, item = heapq.heappop(heap)
+            if item is not _CANCELLED:
+                del self._entries[item]
+                due.append(item)
+        return due
+
+    def pop_next(self, now: int):
+        """Removes and returns the earliest item if it is due at or before now, else None."""
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, _, item = heapq.heappop(heap)
+            if item is not _CANCELLED:
+                del self._entries[item]
+                return item
+        return None
+
+    def clear(self):
+        self._heap.clear()
+        self._entries.clear()
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if entry[2] is not _CANCELLED]
+        heapq.heapify(self._heap)
+
+class EventQueue(TimerQueue):
+    """
+    Delayed events: anything with a fire(now) method, queued for the game time
+    it should fire. Events can be cancelled one by one or all at once by the
+    owner they were queued for (e.g. every pending Hit of an attacker that died).
+    """
+    def __init__(self):
+        super().__init__()
+        self._owners = {}    # event -> owner
+        self._by_owner = {}  # owner -> set of its queued events
+
+    def schedule(self, event, due: int, owner=None):
+        super().schedule(event, due)
+        if owner is not None:
+            self._owners[event] = owner
+            self._by_owner.setdefault(owner, set()).add(event)
+
+    def cancel(self, event) -> bool:
+        self._forget_owner(event)
+        return super().cancel(event)
+
+    def cancel_owner(self, owner) -> int:
+        """Cancels every event queued for owner; returns how many there were."""
+        events = self._by_owner.pop(owner, ())
+        for event in events:
+            self._owners.pop(event, None)
+            super().cancel(event)
+        return len(events)
+
+    def pop_due(self, now: int) -> list:
+        due = super().pop_due(now)
+        for event in due:
+            self._forget_owner(event)
+        return due
+
+    def pop_next(self, now: int):
+        event = super().pop_next(now)
+        if event is not None:
+            self._forget_owner(event)
+        return event
+
+    def run_due(self, now: int) -> int:
+        """
+        Fires every due event, earliest first; returns how many fired. Events are
+        taken one at a time, so one that cancels another (a hit killing an
+        attacker) takes effect within the same call.
+        """
+        fired = 0
+        event = self.pop_next(now)
+        while event is not None:
+            event.fire(now)
+            fired += 1
+            event = self.pop_next(now)
+        return fired
+
+    def clear(self):
+        super().clear()
+        self._owners.clear()
+        self._by_owner.clear()
+
+    def _forget_owner(self, event):
+        owner = self._owners.pop(event, None)
+        if owner is not None:
+            events = self._by_owner[owner]
+            events.discard(event)
+            if not events:
+                del self._by_owner[owner]
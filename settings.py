@@ -7,9 +7,40 @@ TILE_SIZE = 25
 
 MAP_WIDTH = 52
 MAP_HEIGHT = 33
+# World generation, per world tile: 15 forests and 5 villages on a 52x33 map
+FOREST_DENSITY = 15 / (52 * 33)
+VILLAGE_DENSITY = 5 / (52 * 33)
+# Chunked world: generated around the player on demand instead of all up front
+WORLD_CHUNKED = False
+CHUNKED_MAP_WIDTH = 4096
+CHUNKED_MAP_HEIGHT = 4096
+WORLD_CHUNK_SIZE = 64
+WORLD_CHUNK_BUDGET = 4 * 1024 * 1024  # bytes of resident chunk data before LRU eviction
+# Estimated bytes of resident Locations (Map.memory_bytes) before the least recently
+# entered are paged out to LOCATION_STORE_DIR (None = temp dir); a generated one is ~30 KiB
+LOCATION_STORE_BUDGET = 256 * 1024
+LOCATION_STORE_DIR = None
+# Save games; F5 saves to SAVE_PATH and F9 loads it
+SAVE_PATH = "savegame.sav"
+AUTOSAVE_PATH = "autosave.sav"
+AUTOSAVE_INTERVAL_MS = 60000
+LOAD_BUDGET_MS = 200  # loads slower than this are reported
+# Background simulation of Locations the player is not in (offscreen.py)
+OFFSCREEN_INTERVAL_MS = 10000     # how often inactive Locations are sent to the worker pool
+OFFSCREEN_TICK_MS = 1000          # simulated step inside a worker
+OFFSCREEN_MAX_CATCHUP_MS = 300000 # longest stretch simulated in one job
+OFFSCREEN_WORKERS = 2
+OFFSCREEN_MIN_MONSTERS = 3        # monsters respawn while a Location has fewer than this
+OFFSCREEN_RESPAWN_CHANCE = 0.02   # per simulated tick
 PANEL_WIDTH = 250
 FPS = 60
+HEADLESS_SCREEN_SIZE = (1280, 720)  # off-screen surface used by Game(headless=True)
 FONT_SIZE = 20
+TEXT_CACHE_SIZE = 512  # rendered text surfaces kept by text_cache.TEXT_CACHE
+# Frame profiler (profiler.py): F3 turns it on with its overlay, F4 writes a Chrome trace
+PROFILE_FRAMES = 600    # frames the overlay's percentiles are taken over
+PROFILE_EVENTS = 50000  # timed spans kept for the trace export
+PROFILE_TRACE_PATH = "trace.json"
 
 
 COLORS = {
@@ -34,4 +65,13 @@ COLORS = {
 HIT_CHANCE = 1
 DIRECTION_CHANGE_CHANCE = 1
 HIT_DELAY_MS = 800
-GLOBAL_COOLDOWN_MS = 1200
\ No newline at end of file
+GLOBAL_COOLDOWN_MS = 1200
+FIGHT_RANGE = 10        # fighters farther than this from everyone else in their fight drop out of it
+FIGHT_REGROUP_MS = 250  # how often each map merges, splits and starts fights (combat.FightManager)
+
+# Chasing NPCs follow one shared "flow_field" per map, or each keeps an
+# "incremental" (D* Lite) plan that is repaired as actors and doors move.
+CHASE_PLANNER = "flow_field"
+
+WIN_COINS = 10000  # coins in the bag that end the game
+FOV_CACHE_SIZE = 256  # field-of-view results kept per map, by origin cell and radius
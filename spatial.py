@@ -0,0 +1,80 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+BUCKET_SIZE = 8
+
+class SpatialIndex:
+    """Uniform bucket grid over entity positions for point, radius and nearest queries."""
+    def __init__(self, bucket_size: int = BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.buckets: Dict[Tuple[int, int], List] = {}
+        self.positions = {}  # entity -> (x, y) it is indexed at
+
+    def _bucket_key(self, x: int, y: int) -> Tuple[int, int]:
+        return (x // self.bucket_size, y // self.bucket_size)
+
+    def insert(self, entity, x: int, y: int):
+        if entity in self.positions:
+            self.remove(entity)
+        self.positions[entity] = (x, y)
+        self.buckets.setdefault(self._bucket_key(x, y), []).append(entity)
+
+    def remove(self, entity):
+        position = self.positions.pop(entity, None)
+        if position is None: return
+        key = self._bucket_key(*position)
+        bucket = self.buckets[key]
+        bucket.remove(entity)
+        if not bucket:
+            del self.buckets[key]
+
+    def move(self, entity, x: int, y: int):
+        old = self.positions.get(entity)
+        if old is not None and self._bucket_key(*old) == self._bucket_key(x, y):
+            self.positions[entity] = (x, y)
+        else:
+            self.insert(entity, x, y)
+
+    def __contains__(self, entity) -> bool:
+        return entity in self.positions
+
+    def at(self, x: int, y: int) -> List:
+        bucket = self.buckets.get(self._bucket_key(x, y), ())
+        return [e for e in bucket if self.positions[e] == (x, y)]
+
+    def within(self, x: int, y: int, radius: int) -> List:
+        """Entities whose Chebyshev distance to (x, y) is at most radius."""
+        found = []
+        bx0, by0 = self._bucket_key(x - radius, y - radius)
+        bx1, by1 = self._bucket_key(x + radius, y + radius)
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                for entity in self.buckets.get((bx, by), ()):
+                    ex, ey = self.positions[entity]
+                    if abs(ex - x) <= radius and abs(ey - y) <= radius:
+                        found.append(entity)
+        return found
+
+    def nearest(self, x: int, y: int, radius: int, predicate: Optional[Callable] = None):
+        """
+        Closest entity (Manhattan distance) within Chebyshev radius that passes predicate.
+        Searches bucket rings outwards and stops once no closer entity can exist.
+        """
+        size = self.bucket_size
+        cbx, cby = self._bucket_key(x, y)
+        best, best_dist = None, None
+        max_ring = radius // size + 1
+        for ring in range(max_ring + 1):
+            # Every cell in this ring is at least this far away (Chebyshev <= Manhattan).
+            if best is not None and best_dist <= (ring - 1) * size:
+                break
+            for bx in range(cbx - ring, cbx + ring + 1):
+                for by in range(cby - ring, cby + ring + 1):
+                    if max(abs(bx - cbx), abs(by - cby)) != ring: continue
+                    for entity in self.buckets.get((bx, by), ()):
+                        ex, ey = self.positions[entity]
+                        if abs(ex - x) > radius or abs(ey - y) > radius: continue
+                        if predicate and not predicate(entity): continue
+                        dist = abs(ex - x) + abs(ey - y)
+                        if best is None or dist < best_dist:
+                            best, best_dist = entity, dist
+        return best
@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from settings import TEXT_CACHE_SIZE
+
+class TextCache:
+    """Size-bounded LRU of rendered text surfaces, keyed by (font, text, color, antialias)."""
+    def __init__(self, max_size: int = TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text: str, antialias: bool, color):
+        """Drop-in for font.render; the returned surface is shared and must not be drawn on."""
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.surfaces),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+TEXT_CACHE = TextCache()
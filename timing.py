@@ -0,0 +1,33 @@
+"""
+Game time source. Everything that needs "now" in milliseconds calls
+get_ticks(), which reads pygame's clock unless another clock was installed
+with set_clock() (e.g. a VirtualClock for headless runs).
+"""
+import pygame
+
+class RealClock:
+    def get_ticks(self) -> int:
+        return pygame.time.get_ticks()
+
+class VirtualClock:
+    """Clock that only moves when advanced, so simulations can run faster than real time."""
+    def __init__(self, start_ms: int = 0):
+        self.now = start_ms
+
+    def get_ticks(self) -> int:
+        return self.now
+
+    def advance(self, ms: int):
+        self.now += ms
+
+_clock = RealClock()
+
+def set_clock(clock):
+    global _clock
+    _clock = clock
+
+def get_clock():
+    return _clock
+
+def get_ticks() -> int:
+    return _clock.get_ticks()
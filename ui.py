@@ -1,7 +1,9 @@
 import pygame
 import math
 from settings import COLORS, PANEL_WIDTH, FONT_SIZE
-from items import Coins
+from text_cache import TEXT_CACHE
+from items import WEAPON
+from profiler import profiled, FRAME
 
 BOX_SIZE = 40
 BOX_PADDING = 5
@@ -25,22 +27,25 @@ class UI:
 
         self.pile_rects = []
         self.player_rects = []
+        self.profile_lines = None
+        self.profile_surface = None
 
+    @profiled("UI.draw")
     def draw(self, fight_instance=None):
+        """Draws the side panel and hotbar; returns the screen rects it covered."""
         pygame.draw.rect(self.screen, (30, 30, 30), self.panel_rect)
         pygame.draw.line(self.screen, COLORS["WHITE"], (self.width - PANEL_WIDTH, 0), (self.width - PANEL_WIDTH, self.height))
 
         self.draw_text(f"HP: {self.player.health}", self.width - PANEL_WIDTH + 10, 10, COLORS["RED"])
         self.draw_text(f"STR: {self.player.strength}", self.width - PANEL_WIDTH + 100, 10, COLORS["BLUE"])
         
-        coin_item = self.find_coins()
-        money = coin_item.price if coin_item else 0
-        self.draw_text(f"Gold: {money}", self.width - PANEL_WIDTH + 10, 35, COLORS["GOLD"])
+        self.draw_text(f"Gold: {self.player.items.coins}", self.width - PANEL_WIDTH + 10, 35, COLORS["GOLD"])
 
         self.draw_combat_hex(fight_instance)
         self.draw_inventory_sidebar(300)
         self.draw_messages(self.height - 200)
-        self.draw_hotbar()
+        hotbar_rect = self.draw_hotbar()
+        return [self.panel_rect, hotbar_rect]
 
     def draw_hotbar(self):
         game_view_width = self.width - PANEL_WIDTH
@@ -55,7 +60,7 @@ class UI:
             pygame.draw.rect(self.screen, COLORS["WHITE"], box_rect, 1)
 
             # Draw Number
-            num_txt = self.small_font.render(str(i+1), True, (200, 200, 200))
+            num_txt = TEXT_CACHE.render(self.small_font, str(i+1), True, (200, 200, 200))
             self.screen.blit(num_txt, (x + 2, start_y + 2))
 
             item = self.player.hotbar[i]
@@ -64,14 +69,18 @@ class UI:
                     self.player.hotbar[i] = None
                     continue
                 self.draw_item_symbol(item, box_rect)
+        return pygame.Rect(start_x, start_y, 5 * (BOX_SIZE + BOX_PADDING), BOX_SIZE)
 
     def draw_item_symbol(self, item, rect):
         color = item.color
         if hasattr(item, 'equipped') and item.equipped:
             color = COLORS["PURPLE"]
-        txt = self.font.render(item.symbol, True, color)
+        txt = TEXT_CACHE.render(self.font, item.symbol, True, color)
         text_rect = txt.get_rect(center=rect.center)
         self.screen.blit(txt, text_rect)
+        if item.STACKABLE and item.count > 1:
+            count = TEXT_CACHE.render(self.small_font, str(item.count), True, COLORS["WHITE"])
+            self.screen.blit(count, count.get_rect(bottomright=(rect.right - 2, rect.bottom)))
 
     def draw_loot_interface(self, loot_container, name="CONTAINER"):
         self.draw_overlay()
@@ -132,12 +141,12 @@ class UI:
         
         y = rect.y + 5
         for line in lines:
-            txt = self.small_font.render(line, True, COLORS["WHITE"])
+            txt = TEXT_CACHE.render(self.small_font, line, True, COLORS["WHITE"])
             self.screen.blit(txt, (rect.x + 10, y))
             y += 20
 
     def draw_text(self, text, x, y, color=COLORS["WHITE"]):
-        surf = self.font.render(text, True, color)
+        surf = TEXT_CACHE.render(self.font, text, True, color)
         self.screen.blit(surf, (x, y))
 
     def draw_combat_hex(self, fight):
@@ -159,13 +168,14 @@ class UI:
     def draw_inventory_sidebar(self, start_y):
         self.draw_text("EQUIPPED:", self.width - PANEL_WIDTH + 10, start_y, COLORS["GREEN"])
         y = start_y + 25
-        if self.player.weapon:
-            w = self.player.weapon[0]
-            self.draw_text(f"Wpn: {w.name}", self.width - PANEL_WIDTH + 10, y, COLORS["PURPLE"])
+        equipment = self.player.equipment
+        if equipment[WEAPON] is not None:
+            self.draw_text(f"Wpn: {equipment[WEAPON].name}", self.width - PANEL_WIDTH + 10, y, COLORS["PURPLE"])
         else:
             self.draw_text("Wpn: Fists", self.width - PANEL_WIDTH + 10, y, COLORS["GREY"])
         y += 20
-        self.draw_text(f"Armor Pcs: {len(self.player.armor)}", self.width - PANEL_WIDTH + 10, y, COLORS["PURPLE"])
+        armor = sum(item is not None for item in equipment[WEAPON + 1:])
+        self.draw_text(f"Armor Pcs: {armor}", self.width - PANEL_WIDTH + 10, y, COLORS["PURPLE"])
 
     def draw_messages(self, start_y):
         y = start_y
@@ -173,17 +183,33 @@ class UI:
             self.draw_text(msg, self.width - PANEL_WIDTH + 10, y, color)
             y += 20
 
+    def draw_profile(self, profiler, refresh_frames: int = 30):
+        """Frame time percentiles and the busiest phases over the top-left of the view; returns the rect drawn."""
+        if self.profile_surface is None or profiler.frames % refresh_frames == 0:
+            p50, p95, p99 = profiler.percentiles(FRAME)
+            lines = [f"Frame  p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f} ms  ({min(profiler.frames, profiler.max_frames)} frames)"]
+            for name in profiler.phases()[:8]:
+                p50, p95, p99 = profiler.percentiles(name)
+                lines.append(f"{name}  {p50:.2f} / {p95:.2f} / {p99:.2f}")
+            if lines != self.profile_lines:
+                # Rendered here rather than through TEXT_CACHE: the numbers change too often to be worth caching
+                self.profile_lines = lines
+                rendered = [self.small_font.render(line, True, COLORS["WHITE"]) for line in lines]
+                # Never narrower than before, so a shorter line leaves nothing of the old box behind
+                width = max([text.get_width() + 10 for text in rendered]
+                            + [self.profile_surface.get_width() if self.profile_surface else 0])
+                surface = pygame.Surface((width, 18 * len(lines) + 6))
+                surface.fill(COLORS["DARK_BLUE_BG"])
+                for index, text in enumerate(rendered):
+                    surface.blit(text, (5, 3 + 18 * index))
+                self.profile_surface = surface
+        return self.screen.blit(self.profile_surface, (0, 0))
+
     def add_message(self, text, color=COLORS["WHITE"]):
         self.messages.append((text, color))
         if len(self.messages) > 15:
             self.messages.pop(0)
 
-    def find_coins(self):
-        for item in self.player.items:
-            if isinstance(item, Coins):
-                return item
-        return None
-
     def get_mouse_direction(self):
         mx, my = pygame.mouse.get_pos()
         cx, cy = self.hex_center
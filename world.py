@@ -1,8 +1,21 @@
 import random
+from collections import deque
+from itertools import islice
 from typing import List, Optional, Tuple
-from settings import COLORS, MAP_WIDTH, MAP_HEIGHT
+import timing
+from settings import COLORS, MAP_WIDTH, MAP_HEIGHT, FOREST_DENSITY, VILLAGE_DENSITY
+from spatial import SpatialIndex
+from scheduler import TimerQueue, EventQueue
+from path_find import FlowField, RegionLabels
+from combat import FightManager
 
 class Block:
+    # Terrain blocks carry no per-tile state, so maps share one instance per
+    # class through TERRAIN instead of storing a fresh object in every cell.
+    __slots__ = ('symbol', 'priority', 'passable', 'color')
+    is_terrain = False
+    opaque = False  # blocks line of sight (fov.FieldOfView)
+
     def __init__(self, symbol: str, priority: int = 9, passable: bool = True, color: tuple = COLORS["WHITE"]):
         self.symbol = symbol
         self.priority = priority
@@ -13,36 +26,56 @@ class Block:
         return self.symbol
 
 class Plain(Block):
+    __slots__ = ()
+    is_terrain = True
     def __init__(self): super().__init__('.', color=COLORS["GREEN"])
 
 class Wall(Block):
+    __slots__ = ()
+    is_terrain = True
+    opaque = True
     def __init__(self): super().__init__('#', 1, False, color=COLORS["GREY"])
 
 class Door(Block):
+    __slots__ = ()
+    is_terrain = True
     def __init__(self): super().__init__('[', 2, True, color=COLORS["BROWN"])
 
 class Tree(Block):
+    __slots__ = ()
+    is_terrain = True
+    opaque = True
     def __init__(self, cord): super().__init__('o', 1, False, color=COLORS["TREE_GREEN"])
 
 class ForestBlock(Block):
+    __slots__ = ()
+    is_terrain = True
     def __init__(self, cord): super().__init__('F', 2, True, color=COLORS["FOREST_GREEN"])
 
 class ForestDirt(Block):
+    __slots__ = ()
+    is_terrain = True
     def __init__(self): super().__init__(' ', 5, True)
 
 class Village(Block):
+    __slots__ = ('cord', 'houses')
+
     def __init__(self, cord, houses):
         super().__init__('V', 1, True, color=COLORS["BROWN"])
         self.cord = cord
         self.houses = houses
 
 class Chest(Block):
+    __slots__ = ('cord', 'items')
+
     def __init__(self, cord):
         super().__init__('C', 2, True, color=COLORS["GOLD"])
         self.cord = cord
         self.items = []
 
 class ItemsPile(Block):
+    __slots__ = ('cord', 'items')
+
     def __init__(self, cord):
         super().__init__('P', 2, True, color=COLORS["GOLD"])
         self.cord = cord
@@ -51,18 +84,147 @@ class ItemsPile(Block):
 def cord_to_x_y(width: int, cord: int) -> Tuple[int, int]:
     return (cord % width, (cord - cord % width) // width)
 
+def insert_by_priority(stack: list, obj):
+    """Inserts obj above every entry with priority >= its own (highest priority at the bottom)."""
+    index = len(stack)
+    for i, existing_obj in enumerate(stack):
+        if existing_obj.priority < obj.priority:
+            index = i
+            break
+    stack.insert(index, obj)
+
+class TerrainPalette:
+    """Interns stacks of shared terrain blocks so a map cell only stores a one byte id."""
+    def __init__(self):
+        self.blocks = {}    # block class -> shared instance
+        self.stacks = []    # palette id -> tuple of shared blocks, bottom to top
+        self.passable = []  # palette id -> bool
+        self.opaque = []    # palette id -> bool
+        self._ids = {}      # tuple of block classes -> palette id
+        self._transitions = {}
+
+    def intern(self, stack) -> int:
+        key = tuple(type(block) for block in stack)
+        palette_id = self._ids.get(key)
+        if palette_id is None:
+            palette_id = len(self.stacks)
+            if palette_id > 255:
+                raise ValueError("Terrain palette is full")
+            self._ids[key] = palette_id
+            self.stacks.append(tuple(stack))
+            self.passable.append(all(block.passable for block in stack))
+            self.opaque.append(any(block.opaque for block in stack))
+        return palette_id
+
+    def passable_table(self) -> bytes:
+        """bytes.translate table mapping palette id -> 1 if passable else 0."""
+        return bytes(self.passable) + bytes(256 - len(self.passable))
+
+    def opaque_table(self) -> bytes:
+        """bytes.translate table mapping palette id -> 1 if it blocks line of sight else 0."""
+        return bytes(self.opaque) + bytes(256 - len(self.opaque))
+
+    def with_block(self, palette_id: int, block) -> int:
+        key = (palette_id, True, type(block))
+        if key not in self._transitions:
+            stack = list(self.stacks[palette_id])
+            insert_by_priority(stack, self.blocks.setdefault(type(block), block))
+            self._transitions[key] = self.intern(stack)
+        return self._transitions[key]
+
+    def without_block(self, palette_id: int, block) -> int:
+        key = (palette_id, False, type(block))
+        if key not in self._transitions:
+            stack = list(self.stacks[palette_id])
+            stack.remove(block)
+            self._transitions[key] = self.intern(stack)
+        return self._transitions[key]
+
+class ChangeLog:
+    """Bounded journal of changed cells. Readers keep the version they last saw and catch up with since()."""
+    def __init__(self, limit: int = 4096):
+        self.version = 0
+        self.entries = deque(maxlen=limit)
+
+    def record(self, cord: int):
+        self.version += 1
+        self.entries.append(cord)
+
+    def invalidate(self):
+        """Drops the journal so every reader has to resync from scratch."""
+        self.entries.clear()
+        self.version += 1
+
+    def since(self, version: int):
+        """
+        Cells changed after version, or None if the journal no longer reaches
+        that far back or version is not one this journal handed out.
+        """
+        missed = self.version - version
+        if missed < 0 or missed > len(self.entries):
+            return None
+        return list(islice(self.entries, len(self.entries) - missed, None))
+
+TERRAIN = TerrainPalette()
+PLAIN_ID = TERRAIN.intern([TERRAIN.blocks.setdefault(Plain, Plain())])
+
 class Map:
+    # memory_bytes() estimates, from tracemalloc on generated Locations
+    BASE_BYTES = 12288    # indexes, queues and dicts of an empty map
+    ENTITY_BYTES = 1024   # an NPC with its AI helpers and gear
+    OBJECT_BYTES = 160    # a chest, items pile or other map object
+
     def __init__(self, width: int, height: int):
         self.width = width
         self.height = height
         self.entities = []
-        self.events = []
-        self.map_list = []
+        self.entity_index = SpatialIndex()
+        self.update_queue = TimerQueue()  # entities with an update() method -> next game time it is due
+        self.events = EventQueue()  # delayed events (Hit, ...) with fire(now), by due time
+        self.fights = FightManager(self)  # every fight on this map, player's or not
+        self.max_vision = 0  # largest NPC vision seen here, caps the chase flow field
+        self.flow_field = None
+        self.regions = None  # RegionLabels, built on first use
+        self.fov = None      # fov.FieldOfView, built on first use
         self._init_grid()
 
     def _init_grid(self):
-        for _ in range(self.width * self.height):
-            self.map_list.append([Plain()])
+        # One palette id per cell; only containers, entities and Location
+        # markers get a per-cell object list.
+        self.terrain = bytearray([PLAIN_ID]) * (self.width * self.height)
+        self.objects = {}
+        # Passability bitmaps, one byte per cell: terrain blocks only, and
+        # terrain plus impassable objects (entities). Kept current by the
+        # add/remove methods so lookups are a single index read.
+        self.terrain_passability = bytearray([TERRAIN.passable[PLAIN_ID]]) * (self.width * self.height)
+        self.passability = bytearray(self.terrain_passability)
+        self._blockers = {}  # cord -> number of impassable objects on it
+        self._reset_logs()
+
+    def _reset_logs(self):
+        """
+        New change logs; a map re-initialised in place (persist.restore_map)
+        keeps its logs and invalidates them instead, so versions keep counting
+        up and readers holding an older one resync.
+        """
+        for name in ('passability_log', 'terrain_log'):
+            log = getattr(self, name, None)
+            if log is None:
+                setattr(self, name, ChangeLog())
+            else:
+                log.invalidate()
+
+    @property
+    def terrain_version(self) -> int:
+        return self.terrain_log.version
+
+    def terrain_id(self, cord: int) -> int:
+        """Palette id of the terrain stack at cord."""
+        return self.terrain[cord]
+
+    def _set_terrain_id(self, cord: int, palette_id: int):
+        self.terrain[cord] = palette_id
+        self.terrain_log.record(cord)
 
     def add_object(self, obj, x: int = None, y: int = None):
         if x is not None and y is not None:
@@ -72,68 +234,211 @@ class Map:
         else:
             return
 
-        block_stack = self.map_list[cord]
-        # Insert based on priority
-        index = len(block_stack)
-        for i, existing_obj in enumerate(block_stack):
-            if existing_obj.priority < obj.priority:
-                index = i
-                break
-        block_stack.insert(index, obj)
+        if getattr(obj, 'is_terrain', False):
+            self._set_terrain_id(cord, TERRAIN.with_block(self.terrain_id(cord), obj))
+        else:
+            insert_by_priority(self.objects.setdefault(cord, []), obj)
+            if not getattr(obj, 'passable', True):
+                self._blockers[cord] = self._blockers.get(cord, 0) + 1
+        self._refresh_passability(cord)
+
+    def terrain_rewritten(self):
+        """Rebuilds the passability bitmaps after self.terrain was written directly (bulk generation)."""
+        self.terrain_passability[:] = self.terrain.translate(TERRAIN.passable_table())
+        self.passability[:] = self.terrain_passability
+        for cord in self._blockers:
+            self.passability[cord] = 0
+        self.terrain_log.invalidate()
+        self.passability_log.invalidate()
 
     def add_entity(self, entity, x: int, y: int):
         self.add_object(entity, x=x, y=y)
         self.entities.append(entity)
+        self.entity_index.insert(entity, x, y)
+        if hasattr(entity, 'update'):
+            # First wake-up at a random point of its movement cooldown, so NPCs added together
+            # (a generated or restored map) do not all come due in the same frame
+            delay = random.randint(0, getattr(entity, 'movement_cooldown', 0))
+            self.update_queue.schedule(entity, timing.get_ticks() + delay)
+        if not getattr(entity, 'is_player', False):
+            self.max_vision = max(self.max_vision, getattr(entity, 'vision', 0))
 
     def remove_entity(self, entity):
-        if entity in self.entities:
+        if entity in self.entity_index:
             self.entities.remove(entity)
+            self.entity_index.remove(entity)
+            self.update_queue.cancel(entity)
+            self.events.cancel_owner(entity)  # its pending hits can no longer land
+            if getattr(entity, 'fight', None) is not None:
+                entity.fight.remove_entity(entity)  # out of reach of everyone it fought here
         
-        cord = self.width * entity.y + entity.x
-        if entity in self.map_list[cord]:
-            self.map_list[cord].remove(entity)
+        self._remove_from_objects(self.width * entity.y + entity.x, entity)
+
+    def move_entity(self, entity, x: int, y: int):
+        """Moves an entity already on this map to (x, y), keeping its place in entities."""
+        self._remove_from_objects(self.width * entity.y + entity.x, entity)
+        entity.x, entity.y = x, y
+        self.add_object(entity, x=x, y=y)
+        self.entity_index.move(entity, x, y)
+
+    def update_entities(self, now: int, player):
+        """
+        Calls update() on the entities that are due and queues each again for
+        the time it returns (the next frame if it returns None).
+        """
+        for entity in self.update_queue.pop_due(now):
+            if entity not in self.entity_index:
+                continue  # killed by an entity updated earlier this frame
+            wake = entity.update(now, player)
+            if entity in self.entity_index:
+                self.update_queue.schedule(entity, now + 1 if wake is None else wake)
+
+    def wake_near(self, x: int, y: int, radius: int, now: int):
+        """Makes entities within radius of (x, y) due now, e.g. to react to the player moving close."""
+        for entity in self.entity_index.within(x, y, radius):
+            if entity in self.update_queue:
+                self.update_queue.schedule(entity, now)
+
+    def entities_at(self, x: int, y: int) -> list:
+        return self.entity_index.at(x, y)
+
+    def entities_within(self, x: int, y: int, radius: int) -> list:
+        """Entities within Chebyshev distance radius of (x, y)."""
+        return self.entity_index.within(x, y, radius)
+
+    def nearest_entity(self, x: int, y: int, radius: int, predicate=None):
+        return self.entity_index.nearest(x, y, radius, predicate)
 
     def remove_object_at(self, x: int, y: int, cls_type):
         obj = self.get_object_at(x, y, cls_type)
-        if obj:
-            self.map_list[x + y * self.width].remove(obj)
+        if not obj: return
+        cord = x + y * self.width
+        if getattr(obj, 'is_terrain', False):
+            self._set_terrain_id(cord, TERRAIN.without_block(self.terrain_id(cord), obj))
+            self._refresh_passability(cord)
+        else:
+            self._remove_from_objects(cord, obj)
+
+    def _remove_from_objects(self, cord: int, obj):
+        stack = self.objects.get(cord)
+        if stack and obj in stack:
+            stack.remove(obj)
+            if not stack:
+                del self.objects[cord]
+            if not getattr(obj, 'passable', True):
+                self._blockers[cord] -= 1
+                if not self._blockers[cord]:
+                    del self._blockers[cord]
+            self._refresh_passability(cord)
+
+    def _refresh_passability(self, cord: int):
+        open_terrain = TERRAIN.passable[self.terrain[cord]]
+        passable = open_terrain and cord not in self._blockers
+        self.terrain_passability[cord] = open_terrain
+        if self.passability[cord] != passable:
+            self.passability[cord] = passable
+            self.passability_log.record(cord)
+
+    def get_stack(self, cord: int):
+        """Returns everything at cord, bottom to top. Read-only; use add_object/remove_object_at to change it."""
+        terrain = TERRAIN.stacks[self.terrain_id(cord)]
+        objects = self.objects.get(cord)
+        if not objects:
+            return terrain
+        stack = list(terrain)
+        for obj in objects:
+            insert_by_priority(stack, obj)
+        return stack
 
     def get_object_at(self, x: int, y: int, cls_type):
         if not self.check_cords(x, y): return None
-        for obj in self.map_list[x + y * self.width]:
+        for obj in self.get_stack(x + y * self.width):
             if isinstance(obj, cls_type):
                 return obj
         return None
 
     def is_passable(self, x: int, y: int) -> bool:
-        if not self.check_cords(x, y): return False
-        for block in self.map_list[x + y * self.width]:
-            if hasattr(block, "passable") and not block.passable:
-                return False
-        return True
+        return 0 <= x < self.width and 0 <= y < self.height and self.passability[x + y * self.width] == 1
+
+    def is_terrain_passable(self, x: int, y: int) -> bool:
+        """Like is_passable, but ignores entities and other objects standing on the cell."""
+        return 0 <= x < self.width and 0 <= y < self.height and self.terrain_passability[x + y * self.width] == 1
 
     def check_cords(self, x: int, y: int) -> bool:
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def memory_bytes(self) -> int:
+        """Estimated bytes held: the grids and built path caches, plus a flat size per entity and object."""
+        cells = len(self.terrain)
+        size = self.BASE_BYTES + 3 * cells  # terrain, terrain_passability, passability
+        if self.regions is not None:
+            size += self.regions.labels.itemsize * cells
+        if self.flow_field is not None:
+            size += self.flow_field.dist.itemsize * cells
+        objects = sum(len(stack) for stack in self.objects.values()) - len(self.entities)
+        return size + self.ENTITY_BYTES * len(self.entities) + self.OBJECT_BYTES * objects
+
+    def region_labels(self) -> RegionLabels:
+        """Connected regions of passable terrain, brought up to date with the terrain_log."""
+        if self.regions is None:
+            self.regions = RegionLabels(self)
+        else:
+            self.regions.sync()
+        return self.regions
+
+    def region_at(self, x: int, y: int) -> int:
+        """
+        Region label of (x, y); 0 for impassable terrain or outside the map. On a
+        map that keeps no labels all passable terrain counts as one region 1.
+        """
+        if not self.check_cords(x, y):
+            return 0
+        labels = self.region_labels()
+        if labels is None:
+            return int(self.is_terrain_passable(x, y))
+        return labels.region_at(x + y * self.width)
+
+    def field_of_view(self):
+        """Cached line of sight over this map's opaque terrain."""
+        if self.fov is None:
+            from fov import FieldOfView
+            self.fov = FieldOfView(self)
+        return self.fov
+
+    def has_line_of_sight(self, x: int, y: int, target_x: int, target_y: int, radius: int) -> bool:
+        """Whether (target_x, target_y) is within radius (Chebyshev) of (x, y) and not hidden by walls or trees."""
+        return self.field_of_view().can_see(x, y, target_x, target_y, radius)
+
+    def flow_field_to(self, target) -> FlowField:
+        """Shared distance field towards target, rebuilt only when it moved or terrain changed."""
+        if self.flow_field is None:
+            self.flow_field = FlowField(self.width, self.height)
+        self.flow_field.update(self, target.x, target.y, self.max_vision)
+        return self.flow_field
+
 class WorldMap(Map):
-    def generate(self):
+    def generate(self, forest_density: float = FOREST_DENSITY, village_density: float = VILLAGE_DENSITY):
+        """Densities are per tile, so the number of forests and villages scales with map size."""
+        area = self.width * self.height
         # Generate Forests
-        for _ in range(15):
-            start_cord = random.randint(0, self.width * self.height - 1)
-            ForestGenerator.grow(self, start_cord, 10)
+        starts = [random.randint(0, area - 1) for _ in range(max(1, round(area * forest_density)))]
+        ForestGenerator.grow_many(self, starts, 10)
         # Generate Villages
-        for _ in range(5):
-            cord = random.randint(0, self.width * self.height - 1)
+        for _ in range(max(1, round(area * village_density))):
+            cord = random.randint(0, area - 1)
             self.add_object(Village(cord, random.randint(2, 4)), x=None, y=None) # Village has cord inside
 
 class Location(Map):
-    def __init__(self, biome_blocks):
+    ENTRANCE = (1, 1)  # where the player arrives from the world map
+
+    def __init__(self, biome_blocks, generate: bool = True):
         super().__init__(50, 30)
         self.biome_blocks = biome_blocks
         self.priority = 10
         self.symbol = "L"
         self.passable = True
-        self.generate()
+        if generate:  # False for an empty shell that saved state is loaded into
+            self.generate()
 
     def generate(self):
         from entities import Goblin, Ghost 
@@ -152,14 +457,20 @@ class Location(Map):
         if not generated_biome:
             self.generate_forest()
 
-        # Add Monsters
+        # Add Monsters, only where they can reach the player
+        region = self.spawn_region()
         for _ in range(random.randint(3, 8)):
             x = random.randint(0, self.width - 1)
             y = random.randint(0, self.height - 1)
-            if self.is_passable(x, y) and (x > 5 or y > 5):
+            if self.is_passable(x, y) and (x > 5 or y > 5) and self.region_at(x, y) == region:
                 monster = random.choice([Goblin, Ghost])(x, y, self)
                 self.add_entity(monster, x, y)
 
+    def spawn_region(self) -> int:
+        """Region connected to the entrance, or the largest one if the entrance is walled in."""
+        region = self.region_at(*self.ENTRANCE)
+        return region or self.region_labels().largest()
+
     def generate_village(self, village_biome):
         from entities import Human
         from items import Potion, Sword
@@ -197,17 +508,73 @@ class Location(Map):
                 self.add_object(Tree(cord), x=x, y=y)
 
 class ForestGenerator:
+    DECAY_STEP = 15  # added to a branch's decay each tile; growth stops at 100
+
+    @staticmethod
+    def reach(decay: int) -> int:
+        """Furthest a forest started with decay can spread from its start, in tiles."""
+        return max(0, (99 - decay) // ForestGenerator.DECAY_STEP)
+
     @staticmethod
     def grow(map_obj, start_cord, decay):
-        if decay >= 100: return
-        x, y = cord_to_x_y(map_obj.width, start_cord)
-        if not map_obj.check_cords(x, y): return
-        
-        if not map_obj.get_object_at(x, y, ForestBlock):
-            map_obj.add_object(ForestBlock(start_cord), x=x, y=y)
-            decay_step = 15
-            
-            neighbors = [1, -1, map_obj.width, -map_obj.width]
-            for offset in neighbors:
-                if random.randint(0, 100) > decay:
-                    ForestGenerator.grow(map_obj, start_cord + offset, decay + decay_step)
\ No newline at end of file
+        ForestGenerator.grow_many(map_obj, [start_cord], decay)
+
+    @staticmethod
+    def grow_many(map_obj, start_cords, decay):
+        """
+        Grows a forest from every start cord, writing palette ids straight into
+        map_obj.terrain. Uses an explicit stack, so forest size is not bounded
+        by the recursion limit, and rebuilds passability once at the end.
+        """
+        forest = TERRAIN.blocks.setdefault(ForestBlock, ForestBlock(0))
+        terrain = map_obj.terrain
+        size = map_obj.width * map_obj.height
+        neighbors = (1, -1, map_obj.width, -map_obj.width)
+        decay_step = ForestGenerator.DECAY_STEP
+        rand = random.random
+        forested = {}  # palette id -> id with a ForestBlock added (itself if it already has one)
+
+        for start_cord in start_cords:
+            if decay >= 100 or not 0 <= start_cord < size: continue
+            stack = [(start_cord, decay)]
+            while stack:
+                cord, cell_decay = stack.pop()
+                palette_id = terrain[cord]
+                new_id = forested.get(palette_id)
+                if new_id is None:
+                    has_forest = any(isinstance(block, ForestBlock) for block in TERRAIN.stacks[palette_id])
+                    new_id = forested[palette_id] = palette_id if has_forest else TERRAIN.with_block(palette_id, forest)
+                if new_id == palette_id: continue
+                terrain[cord] = new_id
+
+                next_decay = cell_decay + decay_step
+                if next_decay >= 100: continue
+                # Same odds as random.randint(0, 100) > cell_decay
+                threshold = cell_decay + 1
+                for offset in neighbors:
+                    if rand() * 101 >= threshold and 0 <= cord + offset < size:
+                        stack.append((cord + offset, next_decay))
+        map_obj.terrain_rewritten()
+
+    @staticmethod
+    def spread(start_x: int, start_y: int, decay: int, rng=random) -> set:
+        """
+        Cells covered by one forest grown from (start_x, start_y) on an unbounded
+        grid, with the same odds as grow_many. Each forest is grown on its own,
+        so with a seeded rng the result does not depend on what is around it.
+        """
+        cells = set()
+        stack = [(start_x, start_y, decay)] if decay < 100 else []
+        rand = rng.random
+        while stack:
+            x, y, cell_decay = stack.pop()
+            if (x, y) in cells: continue
+            cells.add((x, y))
+
+            next_decay = cell_decay + ForestGenerator.DECAY_STEP
+            if next_decay >= 100: continue
+            threshold = cell_decay + 1
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                if rand() * 101 >= threshold:
+                    stack.append((x + dx, y + dy, next_decay))
+        return cells